@@ -58,6 +58,16 @@ class Settings(BaseSettings):
     def ws_max_message_size_bytes(self) -> int:
         return self.WS_MAX_MESSAGE_SIZE_MB * 1024 * 1024
 
+    @property
+    def uvicorn_ws_max_size_bytes(self) -> int:
+        """
+        `ws_max_size` para uvicorn. Uvicorn cierra la conexión (1009) ante frames
+        mayores que este valor (16 MiB por defecto) antes de que la app los vea;
+        se deja 1 MiB por encima del límite de la app para que sea ésta la que
+        responda FRAME_TOO_LARGE.
+        """
+        return self.ws_max_message_size_bytes + 1024 * 1024
+
     @property
     def max_upload_size_bytes(self) -> int:
         return self.MAX_UPLOAD_SIZE_MB * 1024 * 1024
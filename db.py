@@ -22,7 +22,7 @@ Uso:
 
 from datetime import datetime
 
-from sqlalchemy import ForeignKey, Index, String, Text, func
+from sqlalchemy import ForeignKey, Index, String, Text, event, func
 from sqlalchemy.ext.asyncio import (
     AsyncEngine,
     AsyncSession,
@@ -37,11 +37,30 @@ from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
 
 def _make_engine(database_url: str):
     """Crea el motor async. Acepta la URL desde config para facilitar los tests."""
-    return create_async_engine(
+    engine = create_async_engine(
         database_url,
         echo=False,
         connect_args={"check_same_thread": False},
     )
+    if engine.dialect.name == "sqlite":
+        event.listen(engine.sync_engine, "connect", _set_sqlite_pragmas)
+    return engine
+
+
+def _set_sqlite_pragmas(dbapi_connection, _connection_record) -> None:
+    """
+    Ajustes por conexión del pool de SQLite.
+
+    WAL deja que las lecturas del handler WS no se bloqueen con las escrituras
+    en background (historial, memorias, compactación); busy_timeout espera al
+    lock en lugar de fallar con "database is locked". synchronous se deja en
+    FULL (por defecto): con NORMAL un corte de luz podría perder los últimos
+    commits (memorias, personas).
+    """
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA busy_timeout=5000")
+    cursor.close()
 
 
 def _make_session_factory(engine) -> async_sessionmaker[AsyncSession]:
@@ -8,7 +8,7 @@ Uso (desarrollo):
     uv run uvicorn main:app --reload --ws wsproto
 
 Uso (producción vía Docker):
-    uv run uvicorn main:app --host 0.0.0.0 --port 8000 --ws wsproto
+    uv run uvicorn main:app --host 0.0.0.0 --port 8000 --loop uvloop --ws wsproto
 """
 
 from contextlib import asynccontextmanager
@@ -26,7 +26,7 @@ from fastapi import WebSocket
 
 from routers.health import router as health_router
 from routers.restore import router as restore_router
-from ws_handlers.streaming import ws_interact
+from ws_handlers.streaming import drain_background_tasks, ws_interact
 
 
 # ── Lifespan ──────────────────────────────────────────────────────────────────
@@ -38,7 +38,8 @@ async def lifespan(app: FastAPI):
     init_db()
     await create_all_tables()
     yield
-    # Shutdown
+    # Shutdown: terminar las escrituras en background antes de cerrar el engine
+    await drain_background_tasks()
     from db import engine as _engine
 
     if _engine is not None:
@@ -98,6 +99,10 @@ if __name__ == "__main__":
         host=settings.HOST,
         port=settings.PORT,
         ws="wsproto",
+        ws_max_size=settings.uvicorn_ws_max_size_bytes,
+        # En producción se exige uvloop; en desarrollo "auto" lo usa si existe
+        # (no está disponible en Windows)
+        loop="uvloop" if settings.is_production else "auto",
         reload=not settings.is_production,
         log_level=settings.LOG_LEVEL.lower(),
     )
@@ -19,7 +19,7 @@ Uso:
 
 from datetime import datetime, timezone
 
-from sqlalchemy import delete, select
+from sqlalchemy import delete, insert, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from db import MemoryRow
@@ -125,6 +125,32 @@ class MemoryRepository:
         await self._session.refresh(row)
         return _row_to_entity(row)
 
+    async def save_many(
+        self,
+        items: list[tuple[str, str]],
+        *,
+        person_id: str | None = None,
+        importance: int = 5,
+    ) -> int:
+        """
+        Persiste varias memorias `(memory_type, content)` en un único INSERT.
+
+        Descarta las privadas igual que `save()`. Devuelve cuántas se insertaron.
+        """
+        rows = [
+            {
+                "person_id": person_id,
+                "memory_type": memory_type,
+                "content": content,
+                "importance": importance,
+            }
+            for memory_type, content in items
+            if not is_private(content)
+        ]
+        if rows:
+            await self._session.execute(insert(MemoryRow), rows)
+        return len(rows)
+
     async def get_for_person(
         self,
         person_id: str,
@@ -28,6 +28,7 @@ import logging
 from datetime import datetime
 from zoneinfo import ZoneInfo
 
+import orjson
 from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
 from pydantic import BaseModel, Field
 
@@ -236,6 +237,26 @@ Usa el MISMO idioma del media. Este campo NO se leerá en voz alta."""
 
 # ── Contexto de sesión ────────────────────────────────────────────────────────
 
+# Bloques de recuerdos ya formateados, por sujeto ("general" o "person:<slug>").
+# Cada entrada guarda la huella (id, importancia) de las memorias con las que se
+# construyó; si la huella cambia, el bloque se regenera.
+_MEMORY_LINES_CACHE: dict[str, tuple[tuple, str]] = {}
+
+
+def _format_memory_lines(key: str, memories: list) -> str:
+    """Formatea las memorias como líneas del prompt reutilizando el bloque cacheado."""
+    fingerprint = tuple((m.id, m.importance) for m in memories)
+    cacheable = all(m.id is not None for m in memories)
+    if cacheable:
+        cached = _MEMORY_LINES_CACHE.get(key)
+        if cached is not None and cached[0] == fingerprint:
+            return cached[1]
+
+    text = "\n".join(f"  - {m.content} (importancia {m.importance})" for m in memories)
+    if cacheable:
+        _MEMORY_LINES_CACHE[key] = (fingerprint, text)
+    return text
+
 
 def _build_context_block(
     memory_context: dict,
@@ -289,13 +310,13 @@ def _build_context_block(
 
     general_mems = memory_context.get("general", [])
     if general_mems:
-        lines = [f"  - {m.content} (importancia {m.importance})" for m in general_mems]
-        parts.append("MIS RECUERDOS GENERALES:\n" + "\n".join(lines))
+        lines = _format_memory_lines("general", general_mems)
+        parts.append("MIS RECUERDOS GENERALES:\n" + lines)
 
     person_mems = memory_context.get("person", [])
     if person_id and person_mems:
-        lines = [f"  - {m.content} (importancia {m.importance})" for m in person_mems]
-        parts.append(f"LO QUE SÉ DE {person_id.upper()}:\n" + "\n".join(lines))
+        lines = _format_memory_lines(f"person:{person_id}", person_mems)
+        parts.append(f"LO QUE SÉ DE {person_id.upper()}:\n" + lines)
     elif person_id:
         parts.append(f"PERSONA IDENTIFICADA: {person_id} (sin recuerdos previos aún)")
 
@@ -315,6 +336,32 @@ def _build_context_block(
     return "\n\n".join(parts)
 
 
+# ── Modelo con structured output (cacheado) ──────────────────────────────────
+
+# with_structured_output() convierte el schema de MojiResponse y envuelve el
+# modelo en un runnable nuevo; se construye una sola vez y se reutiliza entre
+# conexiones mientras el singleton de get_model() no cambie.
+_structured_model = None
+_structured_base = None
+
+
+def _get_structured_model():
+    """Devuelve el runnable de structured output, reconstruyéndolo solo si cambia el modelo."""
+    global _structured_model, _structured_base
+    model = get_model()
+    if _structured_model is None or _structured_base is not model:
+        _structured_model = model.with_structured_output(MojiResponse)
+        _structured_base = model
+    return _structured_model
+
+
+def _b64_decoded_size(b64: str) -> int:
+    """Tamaño en bytes de un payload base64 sin decodificarlo (solo para logs)."""
+    if not b64:
+        return 0
+    return len(b64) * 3 // 4 - b64[-2:].count("=")
+
+
 # ── Punto de entrada principal ────────────────────────────────────────────────
 
 
@@ -423,7 +470,7 @@ async def run_agent(
                     if isinstance(part, dict):
                         t = part.get("type", "")
                         if t == "media":
-                            size = len(base64.b64decode(part.get("data", "")))
+                            size = _b64_decoded_size(part.get("data", ""))
                             parts_log.append(
                                 {
                                     "type": "media",
@@ -434,7 +481,7 @@ async def run_agent(
                         elif t == "image_url":
                             url = part.get("image_url", {}).get("url", "")
                             b64_part = url.split(",", 1)[1] if "," in url else ""
-                            size = len(base64.b64decode(b64_part)) if b64_part else 0
+                            size = _b64_decoded_size(b64_part)
                             mime = url.split(";")[0].replace("data:", "") if url else ""
                             parts_log.append(
                                 {"type": "image", "mime_type": mime, "size_bytes": size}
@@ -453,26 +500,28 @@ async def run_agent(
                 result.append({"role": role, "content": preview})
         return result
 
-    logger.info(
-        "[AGENT INPUT] person=%s has_media=%s has_embedding=%s\n%s",
-        person_id,
-        has_media,
-        has_face_embedding,
-        __import__("json").dumps(
-            _loggable_messages(messages), ensure_ascii=False, indent=2
-        ),
-    )
+    # El volcado solo se construye si el nivel INFO está activo
+    if logger.isEnabledFor(logging.INFO):
+        logger.info(
+            "[AGENT INPUT] person=%s has_media=%s has_embedding=%s\n%s",
+            person_id,
+            has_media,
+            has_face_embedding,
+            orjson.dumps(
+                _loggable_messages(messages), option=orjson.OPT_INDENT_2
+            ).decode(),
+        )
     # ─────────────────────────────────────────────────────────────────────────
 
     # Invocar el modelo con structured output
-    model = get_model()
-    structured_model = model.with_structured_output(MojiResponse)
+    structured_model = _get_structured_model()
     result: MojiResponse = await structured_model.ainvoke(messages)  # type: ignore[assignment]
 
-    logger.info(
-        "[AGENT OUTPUT] person=%s\n%s",
-        person_id,
-        __import__("json").dumps(result.model_dump(), ensure_ascii=False, indent=2),
-    )
+    if logger.isEnabledFor(logging.INFO):
+        logger.info(
+            "[AGENT OUTPUT] person=%s\n%s",
+            person_id,
+            orjson.dumps(result.model_dump(), option=orjson.OPT_INDENT_2).decode(),
+        )
 
     return result
@@ -20,9 +20,7 @@ Uso:
     await history.compact_if_needed()
 """
 
-import asyncio
 import logging
-from datetime import datetime, timezone
 
 import db as db_module
 from config import settings
@@ -37,14 +35,17 @@ class ConversationHistory:
     Gestiona el historial de conversación global del robot.
 
     - add_message: Persiste un mensaje en la BD y en la caché en memoria.
+    - add_messages: Igual que add_message para varios mensajes, en un INSERT.
     - get_history: Devuelve todos los mensajes como lista de dicts.
-    - compact_if_needed: Si el historial supera el umbral, lanza compactación
-      asíncrona en background (asyncio.create_task) sin bloquear al llamante.
+    - compact_if_needed: Si el historial supera el umbral, compacta los mensajes
+      antiguos (se llama desde una tarea de background, no desde la respuesta).
     """
 
     def __init__(self) -> None:
         # Caché global en memoria: lista de dicts {role, content, index}
         self._cache: list[dict] = []
+        # Compactación en curso: evita lanzar otra en paralelo
+        self._compacting = False
 
     # ── API pública ───────────────────────────────────────────────────────────
 
@@ -59,7 +60,8 @@ class ConversationHistory:
 
         - `person_id`: slug de la persona identificada en esta interacción (opcional,
           usado solo para logging enriquecido; no se persiste en esta tabla).
-        - Persiste en la tabla conversation_history.
+        - Persiste en la tabla conversation_history (timestamp lo pone la BD
+          con su server_default).
         - Actualiza la caché en memoria.
         """
         index = len(self._cache)
@@ -71,13 +73,52 @@ class ConversationHistory:
                 content=content,
                 message_index=index,
                 is_compacted=False,
-                timestamp=datetime.now(timezone.utc),
             )
             session.add(row)
             await session.commit()
 
         self._cache.append({"role": role, "content": content, "index": index})
 
+    async def add_messages(
+        self,
+        messages: list[tuple[str, str]],
+        person_id: str | None = None,
+    ) -> None:
+        """
+        Añade varios mensajes `(role, content)` en un único INSERT y commit.
+
+        Equivale a llamar a `add_message` por cada uno, en orden; se usa para
+        guardar el par usuario/asistente de cada interacción. `person_id` tiene
+        el mismo uso que en `add_message` (no se persiste).
+        """
+        if not messages:
+            return
+        from sqlalchemy import insert
+
+        start = len(self._cache)
+        entries = [
+            {"role": role, "content": content, "index": start + i}
+            for i, (role, content) in enumerate(messages)
+        ]
+
+        assert db_module.AsyncSessionLocal is not None
+        async with db_module.AsyncSessionLocal() as session:
+            await session.execute(
+                insert(ConversationHistoryRow),
+                [
+                    {
+                        "role": e["role"],
+                        "content": e["content"],
+                        "message_index": e["index"],
+                        "is_compacted": False,
+                    }
+                    for e in entries
+                ],
+            )
+            await session.commit()
+
+        self._cache.extend(entries)
+
     def get_history(self) -> list[dict]:
         """
         Devuelve el historial global como lista de dicts {role, content}.
@@ -112,18 +153,23 @@ class ConversationHistory:
     async def compact_if_needed(self) -> None:
         """
         Si el historial tiene >= CONVERSATION_COMPACTION_THRESHOLD mensajes,
-        lanza una tarea asíncrona en background para compactar los mensajes más
-        antiguos (todos excepto los últimos 5).
+        compacta los mensajes más antiguos (todos excepto los últimos 5).
 
-        La compactación NO bloquea la respuesta al usuario.
+        Se espera a la compactación: el llamante ya corre como tarea de
+        background registrada (ws_handlers.streaming._spawn_bg), así que no
+        bloquea la respuesta al usuario y el shutdown la espera antes de cerrar
+        la BD. Si ya hay una en curso no se lanza otra; la decisión se toma con
+        la caché en memoria, sin consultar la BD.
         """
         threshold = settings.CONVERSATION_COMPACTION_THRESHOLD
 
-        if len(self._cache) >= threshold:
-            asyncio.create_task(
-                self._compact(),
-                name="compact-history",
-            )
+        if self._compacting or len(self._cache) < threshold:
+            return
+        self._compacting = True
+        try:
+            await self._compact()
+        finally:
+            self._compacting = False
 
     # ── Implementación interna ────────────────────────────────────────────────
 
@@ -184,7 +230,6 @@ class ConversationHistory:
                         content=f"[RESUMEN] {summary_text}",
                         message_index=0,
                         is_compacted=True,
-                        timestamp=datetime.now(timezone.utc),
                     )
                 )
 
@@ -91,6 +91,11 @@ _VIDEO_KEYWORDS: frozenset[str] = frozenset(
 )
 
 
+# Longitud mínima que debe tener un texto para contener alguna palabra clave.
+# Las respuestas más cortas se descartan sin recorrer las listas.
+_MIN_KEYWORD_LEN: int = min(len(kw) for kw in _PHOTO_KEYWORDS | _VIDEO_KEYWORDS)
+
+
 # ── Función pública ───────────────────────────────────────────────────────────
 
 
@@ -104,6 +109,9 @@ def classify_intent(response_text: str) -> str | None:
     Nota: video_request se comprueba primero ya que "video" es más específico
     que "foto". Si aparecen ambas intenciones, se prioriza video.
     """
+    if len(response_text) < _MIN_KEYWORD_LEN:
+        return None
+
     lower = response_text.lower()
 
     # Comprobar video antes que foto (mayor especificidad)
@@ -70,10 +70,11 @@ async def _compact_group(
     memory_type: str,
     memories: list[Memory],
     person_id: str | None,
-) -> None:
+) -> bool:
     """
     Pide a Gemini que fusione `memories` y las reemplaza en la BD.
     Si Gemini falla, se registra el error y se mantienen las memorias originales.
+    Devuelve True si se reemplazaron.
     """
     prompt = _build_compaction_prompt(memory_type, memories, person_id)
 
@@ -91,7 +92,7 @@ async def _compact_group(
                 memory_type,
                 person_id,
             )
-            return
+            return False
 
     except Exception:
         logger.exception(
@@ -99,7 +100,7 @@ async def _compact_group(
             memory_type,
             person_id,
         )
-        return
+        return False
 
     old_ids = [m.id for m in memories if m.id is not None]
     await repo.replace_with_compacted(
@@ -115,12 +116,13 @@ async def _compact_group(
         memory_type,
         person_id,
     )
+    return True
 
 
 # ── Punto de entrada público ──────────────────────────────────────────────────
 
 
-async def compact_memories_async(person_id: str | None = None) -> None:
+async def compact_memories_async(person_id: str | None = None) -> int:
     """
     Compacta las memorias de una persona concreta o las memorias generales de Moji.
 
@@ -128,6 +130,7 @@ async def compact_memories_async(person_id: str | None = None) -> None:
     - Por cada tipo de memoria con más de COMPACTION_THRESHOLD entradas activas,
       fusiona todas menos las 2 más recientes (para no perder contexto inmediato).
     - Se lanza como tarea asíncrona en background; los errores se loggean sin propagar.
+    - Devuelve cuántos grupos se compactaron (0 si no cambió nada).
 
     Llamar con asyncio.create_task() para no bloquear la respuesta al usuario:
         asyncio.create_task(compact_memories_async(person_id="persona_juan_01"))
@@ -144,7 +147,7 @@ async def compact_memories_async(person_id: str | None = None) -> None:
             memories = await repo.get_general(include_expired=False)
 
         if not memories:
-            return
+            return 0
 
         # Agrupar por tipo
         by_type: dict[str, list[Memory]] = defaultdict(list)
@@ -152,6 +155,7 @@ async def compact_memories_async(person_id: str | None = None) -> None:
             by_type[mem.memory_type].append(mem)
 
         # Compactar grupos que superen el umbral
+        compacted = 0
         for memory_type, group in by_type.items():
             if len(group) <= COMPACTION_THRESHOLD:
                 continue
@@ -173,7 +177,9 @@ async def compact_memories_async(person_id: str | None = None) -> None:
                 person_id,
                 len(to_compact),
             )
-            await _compact_group(repo, memory_type, to_compact, person_id)
+            if await _compact_group(repo, memory_type, to_compact, person_id):
+                compacted += 1
             _ = to_keep  # las más recientes permanecen intactas
 
         await session.commit()
+    return compacted
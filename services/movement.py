@@ -31,6 +31,7 @@ Uso:
 """
 
 import re as _re
+from functools import lru_cache
 
 
 # ── Primitivas ESP32 ─────────────────────────────────────────────────────────
@@ -394,3 +395,24 @@ def build_response_actions(steps: list[dict]) -> list[dict]:
     if len(protocol_steps) == 1:
         return protocol_steps
     return [build_move_sequence("Movimiento sugerido por Moji", steps)]
+
+
+def response_actions_from_list(steps: list[str]) -> list[dict]:
+    """
+    action_steps_from_list + build_response_actions en una sola llamada.
+
+    El LLM repite a menudo los mismos gestos ("wave:800", "nod:400"...), así que
+    el resultado se cachea por la tupla de pasos. Los dicts devueltos son
+    compartidos entre llamadas: tratarlos como solo lectura.
+    """
+    if not steps:
+        return []
+    return list(_response_actions_cached(tuple(steps)))
+
+
+@lru_cache(maxsize=128)
+def _response_actions_cached(steps: tuple[str, ...]) -> tuple[dict, ...]:
+    expanded = action_steps_from_list(list(steps))
+    if not expanded:
+        return ()
+    return tuple(build_response_actions(expanded))
@@ -23,6 +23,7 @@ os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite:///:memory:")
 
 from main import app  # noqa: E402
 from services.agent import MojiResponse  # noqa: E402
+from ws_handlers.streaming import _context_cache  # noqa: E402
 
 
 # ── Fixtures ──────────────────────────────────────────────────────────────────
@@ -46,6 +47,7 @@ def make_mock_response(**kwargs) -> MojiResponse:
 @pytest.fixture()
 def ws_app():
     """TestClient con lifespan activado (crea la BD in-memory en startup)."""
+    _context_cache.clear()
     with TestClient(app, raise_server_exceptions=True) as client:
         yield client
 
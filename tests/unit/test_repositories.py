@@ -157,6 +157,21 @@ class TestMemoryRepository:
         assert mem.person_id == "p_mem"
         assert mem.importance == 7
 
+    async def test_save_many_inserts_and_skips_private(self, memory_repo):
+        inserted = await memory_repo.save_many(
+            [
+                ("general", "Hay un gato en casa"),
+                ("general", "La contraseña es 1234"),
+                ("experience", "Fuimos al parque"),
+            ]
+        )
+        assert inserted == 2
+        contents = {m.content for m in await memory_repo.get_general()}
+        assert contents == {"Hay un gato en casa", "Fuimos al parque"}
+
+    async def test_save_many_empty_is_noop(self, memory_repo):
+        assert await memory_repo.save_many([]) == 0
+
     async def test_get_general_returns_only_null_person(self, memory_repo, session):
         from db import PersonRow
 
@@ -293,3 +308,21 @@ class TestMediaRepository:
 
     async def test_media_type_for_unknown(self, media_repo):
         assert media_repo.media_type_for("file.pdf") is None
+
+
+# ── db.py: ajustes de conexión SQLite ─────────────────────────────────────────
+
+
+class TestSqlitePragmas:
+    async def test_file_database_uses_wal(self, tmp_path):
+        from sqlalchemy import text
+
+        engine = db_module._make_engine(f"sqlite+aiosqlite:///{tmp_path / 'wal.db'}")
+        try:
+            async with engine.connect() as conn:
+                mode = (await conn.execute(text("PRAGMA journal_mode"))).scalar()
+                timeout = (await conn.execute(text("PRAGMA busy_timeout"))).scalar()
+        finally:
+            await engine.dispose()
+        assert mode == "wal"
+        assert timeout == 5000
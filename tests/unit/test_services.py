@@ -7,10 +7,12 @@ Tests cubiertos:
   - services/history.py:    add_message (con person_id), get_history, compact_if_needed
   - services/intent.py:     classify_intent
   - services/gemini.py:     singleton reset (sin llamada a API)
+  - services/agent.py:      caché del modelo con structured output
 
 No se hacen llamadas reales a la API de Gemini.
 """
 
+import asyncio
 from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
@@ -36,6 +38,10 @@ from services.movement import (
     estimate_step_duration_ms,
     ESP32_PRIMITIVES,
     _GESTURE_ALIASES,
+    _response_actions_cached,
+    action_steps_from_list,
+    build_response_actions,
+    response_actions_from_list,
 )
 
 
@@ -426,6 +432,24 @@ class TestBuildMoveSequence:
         assert "step_count" in result
 
 
+class TestResponseActionsFromList:
+    def test_matches_uncached_pipeline(self):
+        steps = ["wave:800", "nod:400"]
+        expected = build_response_actions(action_steps_from_list(steps))
+        assert response_actions_from_list(steps) == expected
+
+    def test_empty_and_invalid(self):
+        assert response_actions_from_list([]) == []
+        assert response_actions_from_list(["pause"]) == []
+
+    def test_repeated_actions_hit_cache(self):
+        _response_actions_cached.cache_clear()
+        response_actions_from_list(["wave:800"])
+        response_actions_from_list(["wave:800"])
+        info = _response_actions_cached.cache_info()
+        assert (info.hits, info.misses) == (1, 1)
+
+
 # ── ConversationHistory ───────────────────────────────────────────────────────
 
 
@@ -463,19 +487,30 @@ class TestConversationHistory:
         msgs = history.get_history()
         assert set(msgs[0].keys()) == {"role", "content"}
 
+    async def test_persisted_row_gets_db_timestamp(self):
+        """El timestamp de la fila lo asigna la BD (server_default)."""
+        from sqlalchemy import select
+
+        from db import ConversationHistoryRow
+
+        history = ConversationHistory()
+        await history.add_message("user", "Hola")
+        async with db_module.AsyncSessionLocal() as session:
+            row = (await session.execute(select(ConversationHistoryRow))).scalar_one()
+        assert row.timestamp is not None
+
     async def test_compact_if_needed_below_threshold(self):
-        """Sin llegar al umbral, compact_if_needed no lanza tarea."""
+        """Sin llegar al umbral, compact_if_needed no compacta."""
         history = ConversationHistory()
         for i in range(5):
             await history.add_message("user", f"Msg {i}")
 
-        # Parchear create_task para verificar que NO se llama
-        with patch("services.history.asyncio.create_task") as mock_task:
+        with patch.object(history, "_compact", new_callable=AsyncMock) as mock_compact:
             await history.compact_if_needed()
-            mock_task.assert_not_called()
+            mock_compact.assert_not_awaited()
 
     async def test_compact_if_needed_at_threshold(self):
-        """Al llegar al umbral (20), sí debe lanzar la tarea."""
+        """Al llegar al umbral (20), sí debe compactar."""
         history = ConversationHistory()
         # Añadir exactamente CONVERSATION_COMPACTION_THRESHOLD mensajes
         from config import settings
@@ -483,15 +518,32 @@ class TestConversationHistory:
         for i in range(settings.CONVERSATION_COMPACTION_THRESHOLD):
             await history.add_message("user", f"Msg {i}")
 
-        def _close_coro(coro, **kwargs):
-            coro.close()  # cierra el coroutine para evitar RuntimeWarning
-            return MagicMock()
+        with patch.object(history, "_compact", new_callable=AsyncMock) as mock_compact:
+            await history.compact_if_needed()
+            mock_compact.assert_awaited_once()
+
+    async def test_compact_if_needed_skips_while_running(self):
+        """Con una compactación en curso no se lanza otra."""
+        history = ConversationHistory()
+        from config import settings
+
+        for i in range(settings.CONVERSATION_COMPACTION_THRESHOLD):
+            await history.add_message("user", f"Msg {i}")
+
+        release = asyncio.Event()
+
+        async def _slow_compact():
+            await release.wait()
 
-        with patch(
-            "services.history.asyncio.create_task", side_effect=_close_coro
-        ) as mock_task:
+        with patch.object(
+            history, "_compact", new_callable=AsyncMock, side_effect=_slow_compact
+        ) as mock_compact:
+            first = asyncio.create_task(history.compact_if_needed())
+            await asyncio.sleep(0)
             await history.compact_if_needed()
-            mock_task.assert_called_once()
+            release.set()
+            await first
+            mock_compact.assert_awaited_once()
 
     async def test_compact_updates_cache(self):
         """_compact debe reducir el historial en memoria."""
@@ -529,6 +581,18 @@ class TestConversationHistory:
         assert len(msgs) == 2
         assert msgs[0]["content"] == "Persistido"
 
+    async def test_add_messages_persists_pair_in_order(self):
+        """add_messages guarda varios mensajes con índices consecutivos."""
+        h1 = ConversationHistory()
+        await h1.add_message("user", "Antes")
+        await h1.add_messages([("user", "Hola"), ("assistant", "¡Hola!")])
+        assert [m["content"] for m in h1.get_history()] == ["Antes", "Hola", "¡Hola!"]
+
+        h2 = ConversationHistory()
+        await h2.load_from_db()
+        assert h2.get_history() == h1.get_history()
+        assert [m["index"] for m in h2._cache] == [0, 1, 2]
+
 
 # ── classify_intent ───────────────────────────────────────────────────────────
 
@@ -565,6 +629,12 @@ class TestClassifyIntent:
     def test_empty_string(self):
         assert classify_intent("") is None
 
+    def test_text_shorter_than_any_keyword(self):
+        assert classify_intent("Sí") is None
+
+    def test_shortest_keyword_still_matches(self):
+        assert classify_intent("Filma") == "video_request"
+
     def test_unrelated_text(self):
         assert classify_intent("El tiempo estará nublado mañana") is None
 
@@ -573,3 +643,81 @@ class TestClassifyIntent:
 
     def test_photo_partial_match(self):
         assert classify_intent("hazme una foto rápida") == "photo_request"
+
+
+# ── services/agent.py: caché del modelo con structured output ────────────────
+
+
+class TestStructuredModelCache:
+    def test_structured_model_reused_between_calls(self):
+        from services import agent
+
+        model = MagicMock()
+        with patch("services.agent.get_model", return_value=model):
+            first = agent._get_structured_model()
+            second = agent._get_structured_model()
+        assert first is second
+        model.with_structured_output.assert_called_once()
+
+    def test_structured_model_rebuilt_when_base_model_changes(self):
+        from services import agent
+
+        model_a, model_b = MagicMock(), MagicMock()
+        with patch("services.agent.get_model", return_value=model_a):
+            agent._get_structured_model()
+        with patch("services.agent.get_model", return_value=model_b):
+            agent._get_structured_model()
+        model_b.with_structured_output.assert_called_once()
+
+
+# ── services/agent.py: caché del bloque de recuerdos ─────────────────────────
+
+
+class TestMemoryLinesCache:
+    def _mem(self, mem_id, content, importance=5):
+        from models.entities import Memory
+
+        return Memory(
+            memory_type="general", content=content, importance=importance, id=mem_id
+        )
+
+    def test_same_memories_reuse_cached_block(self):
+        from services.agent import _format_memory_lines
+
+        mems = [self._mem(1, "Hay un gato"), self._mem(2, "Llueve mucho")]
+        first = _format_memory_lines("test:reuse", mems)
+        second = _format_memory_lines("test:reuse", list(mems))
+        assert first is second
+        assert "  - Hay un gato (importancia 5)" in first
+
+    def test_changed_memories_rebuild_block(self):
+        from services.agent import _format_memory_lines
+
+        _format_memory_lines("test:change", [self._mem(1, "Hay un gato")])
+        text = _format_memory_lines("test:change", [self._mem(3, "Hay un perro")])
+        assert "Hay un perro" in text
+        assert "Hay un gato" not in text
+
+
+# ── services/agent.py: tamaño de media para logs ─────────────────────────────
+
+
+class TestB64DecodedSize:
+    @pytest.mark.parametrize("payload", [b"", b"a", b"ab", b"abc", b"x" * 1000])
+    def test_matches_decoded_length(self, payload):
+        import base64
+
+        from services.agent import _b64_decoded_size
+
+        encoded = base64.b64encode(payload).decode()
+        assert _b64_decoded_size(encoded) == len(payload)
+
+
+# ── services/memory_compaction.py ────────────────────────────────────────────
+
+
+class TestCompactMemoriesAsync:
+    async def test_no_memories_returns_zero(self):
+        from services.memory_compaction import compact_memories_async
+
+        assert await compact_memories_async(person_id="persona_sin_memorias") == 0
@@ -8,7 +8,10 @@ Cubre:
 """
 
 import asyncio
+import base64
+import hashlib
 import json
+import threading
 from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
@@ -32,8 +35,17 @@ from ws_handlers.protocol import (
     new_request_id,
 )
 from ws_handlers.streaming import (
+    _b64_field,
+    _context_cache,
+    _ContextCache,
+    _face_scan_message,
     _load_moji_context,
+    _OutboundQueue,
+    _post_response_bg,
     _process_interaction,
+    _save_turn_bg,
+    _spawn_bg,
+    drain_background_tasks,
     ws_interact,
 )
 
@@ -47,6 +59,7 @@ async def setup_db():
     from db import create_all_tables
 
     await create_all_tables()
+    _context_cache.clear()
     yield
     if db_module.engine is not None:
         await db_module.engine.dispose()
@@ -107,6 +120,11 @@ class TestProtocolBuilders:
         assert result["person_identified"] == "persona_ana_001"
         assert result["confidence"] == pytest.approx(0.95)
 
+    def test_non_ascii_text_not_escaped(self):
+        raw = make_text_chunk("req-1", "¡Hola, Ana! ¿Qué tal?")
+        assert "¿Qué tal?" in raw
+        assert json.loads(raw)["text"] == "¡Hola, Ana! ¿Qué tal?"
+
     def test_make_text_chunk(self):
         result = json.loads(make_text_chunk("req-3", "Hola mundo"))
         assert result == {
@@ -254,6 +272,13 @@ class TestAuthenticateWebSocket:
         assert result is None
         ws.close.assert_called_once_with(code=1008)
 
+    async def test_non_object_json_rejected(self):
+        """JSON válido que no es un objeto → devuelve None y cierra."""
+        ws = make_mock_ws(receive_text_values=['["auth"]'])
+        result = await authenticate_websocket(ws)
+        assert result is None
+        ws.close.assert_called_once_with(code=1008)
+
     async def test_auth_returns_true(self):
         """Auth exitosa retorna True (sin session_id)."""
         ws = make_mock_ws(
@@ -310,6 +335,396 @@ class TestLoadMojiContext:
             assert ctx == {}
 
 
+class TestContextCache:
+    async def test_reuses_context_within_ttl(self):
+        cache = _ContextCache(ttl=30.0)
+        with patch(
+            "ws_handlers.streaming._load_moji_context",
+            new_callable=AsyncMock,
+            return_value={"general": []},
+        ) as load_mock:
+            first = await cache.get("p1")
+            second = await cache.get("p1")
+        assert first is second
+        load_mock.assert_awaited_once_with("p1")
+
+    async def test_expired_entry_reloads(self):
+        cache = _ContextCache(ttl=0.0)
+        with patch(
+            "ws_handlers.streaming._load_moji_context",
+            new_callable=AsyncMock,
+            return_value={},
+        ) as load_mock:
+            await cache.get("p1")
+            await cache.get("p1")
+        assert load_mock.await_count == 2
+
+    async def test_invalidate_person_and_general(self):
+        cache = _ContextCache()
+        with patch(
+            "ws_handlers.streaming._load_moji_context",
+            new_callable=AsyncMock,
+            return_value={},
+        ) as load_mock:
+            await cache.get("p1")
+            await cache.get("p2")
+            cache.invalidate("p1")
+            await cache.get("p1")
+            await cache.get("p2")
+            assert load_mock.await_count == 3
+            # Memoria general (person_id None) → afecta a todos los contextos
+            cache.invalidate(None)
+            await cache.get("p2")
+            assert load_mock.await_count == 4
+
+    async def test_concurrent_misses_load_once(self):
+        cache = _ContextCache()
+        release = asyncio.Event()
+
+        async def _slow_load(_person_id):
+            await release.wait()
+            return {"general": []}
+
+        with patch(
+            "ws_handlers.streaming._load_moji_context",
+            new_callable=AsyncMock,
+            side_effect=_slow_load,
+        ) as load_mock:
+            tasks = [asyncio.create_task(cache.get("p1")) for _ in range(3)]
+            await asyncio.sleep(0)
+            release.set()
+            results = await asyncio.gather(*tasks)
+        load_mock.assert_awaited_once_with("p1")
+        assert all(r is results[0] for r in results)
+
+    async def test_load_racing_invalidation_is_not_stored(self):
+        cache = _ContextCache()
+
+        async def _load_then_invalidated(person_id):
+            cache.invalidate(person_id)  # una escritura termina durante la carga
+            return {"general": []}
+
+        with patch(
+            "ws_handlers.streaming._load_moji_context",
+            new_callable=AsyncMock,
+            side_effect=_load_then_invalidated,
+        ) as load_mock:
+            await cache.get("p1")
+            await cache.get("p1")
+        assert load_mock.await_count == 2
+
+    async def test_oldest_entry_evicted_at_maxsize(self):
+        cache = _ContextCache(maxsize=2)
+        with patch(
+            "ws_handlers.streaming._load_moji_context",
+            new_callable=AsyncMock,
+            return_value={},
+        ) as load_mock:
+            for pid in ("p1", "p2", "p3", "p2", "p1"):
+                await cache.get(pid)
+        # p1 se expulsó al entrar p3; p2 seguía en caché
+        assert [c.args[0] for c in load_mock.await_args_list] == [
+            "p1",
+            "p2",
+            "p3",
+            "p1",
+        ]
+
+    async def test_locks_released_after_load(self):
+        cache = _ContextCache()
+        release = asyncio.Event()
+
+        async def _slow_load(_person_id):
+            await release.wait()
+            return {}
+
+        with patch(
+            "ws_handlers.streaming._load_moji_context",
+            new_callable=AsyncMock,
+            side_effect=_slow_load,
+        ):
+            tasks = [asyncio.create_task(cache.get(f"p{i % 2}")) for i in range(4)]
+            await asyncio.sleep(0)
+            assert set(cache._locks) == {"p0", "p1"}
+            release.set()
+            await asyncio.gather(*tasks)
+        assert cache._locks == {}
+
+
+class TestPostResponseBg:
+    async def test_history_then_compaction(self):
+        calls: list[str] = []
+        with (
+            patch(
+                "ws_handlers.streaming._save_history_bg",
+                new_callable=AsyncMock,
+                side_effect=lambda **_: calls.append("history"),
+            ),
+            patch(
+                "ws_handlers.streaming.compact_memories_async",
+                new_callable=AsyncMock,
+                side_effect=lambda **_: calls.append("compact"),
+            ) as compact_mock,
+        ):
+            await _post_response_bg(ConversationHistory(), "Hola", "¡Hola!", "p1")
+        assert calls == ["history", "compact"]
+        compact_mock.assert_awaited_once_with(person_id="p1")
+
+    async def test_compaction_error_is_logged_not_raised(self):
+        with (
+            patch("ws_handlers.streaming._save_history_bg", new_callable=AsyncMock),
+            patch(
+                "ws_handlers.streaming.compact_memories_async",
+                new_callable=AsyncMock,
+                side_effect=RuntimeError("db caída"),
+            ),
+        ):
+            await _post_response_bg(ConversationHistory(), "Hola", "¡Hola!")
+
+
+class TestSaveTurnBg:
+    async def test_persists_memories_and_invalidates_context(self):
+        from repositories.memory import MemoryRepository
+
+        with patch.object(_context_cache, "invalidate") as invalidate_mock:
+            await _save_turn_bg([("general", "Hay un gato en casa")])
+        invalidate_mock.assert_called_once_with(None)
+        async with db_module.AsyncSessionLocal() as session:
+            mems = await MemoryRepository(session).get_general()
+        assert [m.content for m in mems] == ["Hay un gato en casa"]
+
+    async def test_registers_person_with_decoded_embedding(self):
+        from repositories.people import PeopleRepository
+
+        raw = bytes(range(16))
+        await _save_turn_bg(
+            [],
+            person_id="persona_ana_001",
+            person_name="Ana",
+            face_embedding_b64=base64.b64encode(raw).decode(),
+        )
+        async with db_module.AsyncSessionLocal() as session:
+            repo = PeopleRepository(session)
+            person = await repo.get_by_person_id("persona_ana_001")
+            embs = await repo.get_embeddings("persona_ana_001")
+        assert person is not None and person.name == "Ana"
+        assert [e.embedding for e in embs] == [raw]
+
+    async def test_memories_and_person_share_one_commit(self):
+        from repositories.memory import MemoryRepository
+        from repositories.people import PeopleRepository
+
+        real_factory = db_module.AsyncSessionLocal
+        with patch.object(
+            db_module, "AsyncSessionLocal", MagicMock(side_effect=real_factory)
+        ) as factory:
+            await _save_turn_bg(
+                [("person_fact", "Le gusta el café")],
+                person_id="persona_ana_003",
+                person_name="Ana",
+                face_embedding_b64=base64.b64encode(b"emb").decode(),
+            )
+        factory.assert_called_once()
+        async with db_module.AsyncSessionLocal() as session:
+            mems = await MemoryRepository(session).get_for_person("persona_ana_003")
+            person = await PeopleRepository(session).get_by_person_id("persona_ana_003")
+        assert [m.content for m in mems] == ["Le gusta el café"]
+        assert person is not None
+
+    async def test_slug_is_stable_for_same_name(self):
+        from repositories.people import PeopleRepository
+
+        raw = bytes(range(16))
+        for _ in range(2):
+            await _save_turn_bg(
+                [],
+                person_name="Ana María",
+                face_embedding_b64=base64.b64encode(raw).decode(),
+            )
+        suffix = hashlib.blake2b("Ana María".encode(), digest_size=2).hexdigest()
+        slug = f"persona_ana_maría_{suffix}"
+        async with db_module.AsyncSessionLocal() as session:
+            repo = PeopleRepository(session)
+            person = await repo.get_by_person_id(slug)
+            embs = await repo.get_embeddings(slug)
+        assert person is not None
+        assert len(embs) == 2
+
+    @pytest.mark.parametrize("bad_embedding", ["abcde", "ñandú", 12345])
+    async def test_invalid_embedding_keeps_memories(self, bad_embedding):
+        from repositories.memory import MemoryRepository
+        from repositories.people import PeopleRepository
+
+        await _save_turn_bg(
+            [("person_fact", "Tiene un perro")],
+            person_id="persona_ana_002",
+            person_name="Ana",
+            face_embedding_b64=bad_embedding,
+        )
+        async with db_module.AsyncSessionLocal() as session:
+            assert (
+                await PeopleRepository(session).get_by_person_id("persona_ana_002")
+                is None
+            )
+            mems = await MemoryRepository(session).get_for_person("persona_ana_002")
+        assert [m.content for m in mems] == ["Tiene un perro"]
+
+
+class TestB64Field:
+    async def test_decodes_field(self):
+        raw = base64.b64encode(b"imagen").decode()
+        assert await _b64_field({"data": raw}, "data") == b"imagen"
+
+    async def test_missing_or_empty_field_returns_none(self):
+        assert await _b64_field({}, "data") is None
+        assert await _b64_field({"data": ""}, "data") is None
+
+    async def test_invalid_base64_returns_none(self):
+        assert await _b64_field({"data": 123}, "data") is None
+
+    async def test_large_payload_decoded_in_thread(self):
+        payload = b"x" * (100 * 1024)
+        raw = base64.b64encode(payload).decode()
+        threads: list[str] = []
+        real_decode = base64.b64decode
+
+        def _decode(data):
+            threads.append(threading.current_thread().name)
+            return real_decode(data)
+
+        with patch("ws_handlers.streaming.base64.b64decode", side_effect=_decode):
+            assert await _b64_field({"data": raw}, "data") == payload
+        assert threads and threads[0].startswith("ws-b64")
+
+    async def test_small_payload_decoded_inline(self):
+        threads: list[str] = []
+        real_decode = base64.b64decode
+
+        def _decode(data):
+            threads.append(threading.current_thread().name)
+            return real_decode(data)
+
+        raw = base64.b64encode(b"poco").decode()
+        with patch("ws_handlers.streaming.base64.b64decode", side_effect=_decode):
+            assert await _b64_field({"data": raw}, "data") == b"poco"
+        assert threads == [threading.current_thread().name]
+
+
+class TestFaceScanMessage:
+    def test_matches_protocol_builder(self):
+        from services.movement import protocol_steps_from_steps
+        from ws_handlers.streaming import _FACE_SCAN_SEQUENCE
+
+        expected = make_face_scan_actions(
+            "req-f1", protocol_steps_from_steps(_FACE_SCAN_SEQUENCE)
+        )
+        assert _face_scan_message("req-f1") == expected
+
+    def test_request_id_is_escaped(self):
+        result = json.loads(_face_scan_message('a"b'))
+        assert result["request_id"] == 'a"b'
+
+
+class TestSpawnBg:
+    async def test_task_referenced_until_done(self):
+        import ws_handlers.streaming as streaming
+
+        done = asyncio.Event()
+
+        async def _job():
+            await done.wait()
+
+        task = _spawn_bg(_job(), name="test-bg")
+        assert task in streaming._bg_tasks
+        done.set()
+        await task
+        assert task not in streaming._bg_tasks
+
+    async def test_drops_work_when_full(self):
+        async def _job():
+            pass
+
+        coro = _job()
+        with patch("ws_handlers.streaming._BG_MAX_PENDING", 0):
+            assert _spawn_bg(coro, name="test-bg") is None
+        assert coro.cr_frame is None  # cerrada, sin warning de "never awaited"
+
+    async def test_unhandled_error_is_logged(self, caplog):
+        async def _job():
+            raise RuntimeError("fallo")
+
+        task = _spawn_bg(_job(), name="test-bg")
+        with caplog.at_level("ERROR", logger="ws_handlers.streaming"):
+            await task
+        assert task.exception() is None
+        assert "fallo" in caplog.text
+
+    async def test_drain_waits_for_pending_work(self):
+        saved: list[str] = []
+
+        async def _job():
+            await asyncio.sleep(0.01)
+            saved.append("ok")
+
+        _spawn_bg(_job(), name="test-bg")
+        await drain_background_tasks()
+        assert saved == ["ok"]
+
+    async def test_drain_cancels_after_timeout(self):
+        async def _job():
+            await asyncio.Event().wait()
+
+        task = _spawn_bg(_job(), name="test-bg")
+        await drain_background_tasks(timeout=0.01)
+        assert task.cancelled()
+
+
+class TestOutboundQueue:
+    async def test_messages_sent_in_order(self):
+        ws = make_mock_ws()
+        outbound = _OutboundQueue(ws)
+        outbound.start()
+        for text in ("a", "b", "c"):
+            outbound.put(text)
+        await outbound.aclose()
+        assert [c[0][0] for c in ws.send_text.call_args_list] == ["a", "b", "c"]
+
+    async def test_stops_sending_after_first_failure(self):
+        """Tras un fallo de envío, el resto de mensajes se descarta."""
+        ws = make_mock_ws()
+        ws.send_text = AsyncMock(side_effect=RuntimeError("closed"))
+        outbound = _OutboundQueue(ws)
+        outbound.start()
+        outbound.put("a")
+        outbound.put("b")
+        await outbound.aclose()
+        assert ws.send_text.await_count == 1
+        assert outbound.closed
+
+    async def test_full_queue_drops_and_closes(self):
+        """Cliente que no drena: al llenarse la cola se descarta y se cierra."""
+        ws = make_mock_ws()
+        blocked = asyncio.Event()
+
+        async def _never_returns(_text):
+            await blocked.wait()
+
+        ws.send_text = AsyncMock(side_effect=_never_returns)
+        outbound = _OutboundQueue(ws, maxsize=2)
+        outbound.start()
+        outbound.put("a")
+        await asyncio.sleep(0)  # la tarea escritora queda bloqueada en "a"
+        outbound.put("b")
+        outbound.put("c")
+        assert not outbound.closed
+        outbound.put("d")
+        assert outbound.closed
+
+        # aclose no espera al socket bloqueado
+        await asyncio.wait_for(outbound.aclose(), timeout=1.0)
+        assert ws.send_text.await_count == 1
+
+
 # ═══════════════════════════════════════════════════════════════════════════════
 # SECCIÓN 4 — _process_interaction (structured output)
 # ═══════════════════════════════════════════════════════════════════════════════
@@ -506,6 +921,32 @@ class TestProcessInteraction:
         assert "memory" not in meta["response_text"]
         assert meta["response_text"] == "¡Qué bueno saberlo!"
 
+    async def test_memories_persisted_in_single_task(self):
+        """Varias memories de una respuesta → un único _save_turn_bg."""
+        from services.agent import MemoryEntry
+
+        save_mock = AsyncMock()
+        with patch("ws_handlers.streaming._save_turn_bg", save_mock):
+            await self._run_process(
+                response=make_mock_response(
+                    memories=[
+                        MemoryEntry(
+                            memory_type="person_fact", content="Le gusta el café"
+                        ),
+                        MemoryEntry(
+                            memory_type="experience", content="Fuimos al parque"
+                        ),
+                    ],
+                )
+            )
+            await asyncio.sleep(0)
+        save_mock.assert_awaited_once_with(
+            [("person_fact", "Le gusta el café"), ("experience", "Fuimos al parque")],
+            person_id="person_test",
+            person_name=None,
+            face_embedding_b64=None,
+        )
+
     async def test_person_name_in_response_meta(self):
         """person_name del structured output → response_meta.person_name."""
         ws = await self._run_process(
@@ -518,6 +959,32 @@ class TestProcessInteraction:
         assert len(metas) == 1
         assert metas[0].get("person_name") == "Ana"
 
+    async def test_empty_exchange_skips_post_response(self):
+        """Entrada y respuesta vacías → no se lanza el guardado de historial."""
+        ws = make_mock_ws()
+        with (
+            patch(
+                "ws_handlers.streaming.run_agent",
+                new_callable=AsyncMock,
+                return_value=make_mock_response(response_text="  "),
+            ),
+            patch(
+                "ws_handlers.streaming._load_moji_context",
+                new_callable=AsyncMock,
+                return_value={},
+            ),
+            patch("ws_handlers.streaming._post_response_bg") as post_mock,
+        ):
+            await _process_interaction(
+                websocket=ws,
+                person_id=None,
+                request_id="req-empty",
+                user_input="",
+                input_type="text",
+                history_service=ConversationHistory(),
+            )
+        post_mock.assert_not_called()
+
 
 # ═══════════════════════════════════════════════════════════════════════════════
 # SECCIÓN 4b — _process_interaction con media (audio/imagen/video)
@@ -949,6 +1416,53 @@ class TestWsInteract:
         assert "emotion" in types
         assert "stream_end" in types
 
+    async def test_text_without_request_id_reuses_interaction_start_id(self):
+        """text sin request_id → usa el de interaction_start."""
+        ws = make_mock_ws(
+            receive_text_values=[
+                json.dumps(
+                    {"type": "auth", "api_key": "test-api-key-for-unit-tests-only"}
+                )
+            ],
+            receive_messages=[
+                {
+                    "type": "websocket.receive",
+                    "text": json.dumps(
+                        {"type": "interaction_start", "request_id": "req-start"}
+                    ),
+                    "bytes": None,
+                },
+                {
+                    "type": "websocket.receive",
+                    "text": json.dumps({"type": "text", "content": "Hola"}),
+                    "bytes": None,
+                },
+                {"type": "websocket.disconnect"},
+            ],
+        )
+
+        with (
+            patch(
+                "ws_handlers.streaming.run_agent",
+                new_callable=AsyncMock,
+                return_value=make_mock_response(),
+            ),
+            patch("ws_handlers.streaming._save_history_bg", new_callable=AsyncMock),
+            patch(
+                "ws_handlers.streaming._load_moji_context",
+                new_callable=AsyncMock,
+                return_value={},
+            ),
+            patch(
+                "ws_handlers.streaming.compact_memories_async", new_callable=AsyncMock
+            ),
+        ):
+            await ws_interact(ws)
+
+        all_sent = [json.loads(c[0][0]) for c in ws.send_text.call_args_list]
+        end = next(m for m in all_sent if m["type"] == "stream_end")
+        assert end["request_id"] == "req-start"
+
     async def test_invalid_json_message_sends_error(self):
         """Mensaje de texto no-JSON → se envía error y se continúa."""
         ws = make_mock_ws(
@@ -973,6 +1487,78 @@ class TestWsInteract:
         errors = [m for m in all_sent if m["type"] == "error"]
         assert len(errors) >= 1
 
+    async def test_non_object_json_sends_invalid_message(self):
+        """JSON válido que no es un objeto → INVALID_MESSAGE sin cerrar el bucle."""
+        ws = make_mock_ws(
+            receive_text_values=[
+                json.dumps(
+                    {"type": "auth", "api_key": "test-api-key-for-unit-tests-only"}
+                )
+            ],
+            receive_messages=[
+                {"type": "websocket.receive", "text": "[1, 2, 3]", "bytes": None},
+                {"type": "websocket.disconnect"},
+            ],
+        )
+
+        await ws_interact(ws)
+
+        all_sent = [json.loads(c[0][0]) for c in ws.send_text.call_args_list]
+        codes = [m["error_code"] for m in all_sent if m["type"] == "error"]
+        assert codes == ["INVALID_MESSAGE"]
+
+    async def test_unknown_message_type_is_ignored(self):
+        """Tipo de mensaje sin handler → se ignora sin error ni respuesta."""
+        ws = make_mock_ws(
+            receive_text_values=[
+                json.dumps(
+                    {"type": "auth", "api_key": "test-api-key-for-unit-tests-only"}
+                )
+            ],
+            receive_messages=[
+                {
+                    "type": "websocket.receive",
+                    "text": json.dumps({"type": "no_existe"}),
+                    "bytes": None,
+                },
+                {"type": "websocket.disconnect"},
+            ],
+        )
+
+        with patch(
+            "ws_handlers.streaming._process_interaction", new_callable=AsyncMock
+        ) as process_mock:
+            await ws_interact(ws)
+
+        process_mock.assert_not_awaited()
+        all_sent = [json.loads(c[0][0]) for c in ws.send_text.call_args_list]
+        assert [m for m in all_sent if m["type"] == "error"] == []
+
+    async def test_nan_literal_rejected_as_invalid_message(self):
+        """orjson no acepta NaN (json.loads sí) → INVALID_MESSAGE."""
+        ws = make_mock_ws(
+            receive_text_values=[
+                json.dumps(
+                    {"type": "auth", "api_key": "test-api-key-for-unit-tests-only"}
+                )
+            ],
+            receive_messages=[
+                {
+                    "type": "websocket.receive",
+                    "text": '{"type": "text", "content": "hola", "x": NaN}',
+                    "bytes": None,
+                },
+                {"type": "websocket.disconnect"},
+            ],
+        )
+
+        await ws_interact(ws)
+
+        all_sent = [json.loads(c[0][0]) for c in ws.send_text.call_args_list]
+        codes = [m["error_code"] for m in all_sent if m["type"] == "error"]
+        assert codes == ["INVALID_MESSAGE"]
+        assert "emotion" not in [m["type"] for m in all_sent]
+
     async def test_binary_audio_accumulates_without_processing(self):
         """Frames binarios se acumulan sin procesar hasta audio_end."""
         ws = make_mock_ws(
@@ -1006,6 +1592,156 @@ class TestWsInteract:
         assert "auth_ok" in types
         assert "stream_end" not in types
 
+    async def test_audio_frames_joined_on_audio_end(self):
+        """Los frames de audio se unen en audio_end; interaction_start los descarta."""
+
+        def _frame(data: bytes) -> dict:
+            return {"type": "websocket.receive", "text": None, "bytes": data}
+
+        def _json(payload: dict) -> dict:
+            return {
+                "type": "websocket.receive",
+                "text": json.dumps(payload),
+                "bytes": None,
+            }
+
+        ws = make_mock_ws(
+            receive_text_values=[
+                json.dumps(
+                    {"type": "auth", "api_key": "test-api-key-for-unit-tests-only"}
+                )
+            ],
+            receive_messages=[
+                _frame(b"viejo"),
+                _json({"type": "interaction_start", "request_id": "r1"}),
+                _frame(b"\x00\x01"),
+                _frame(b"\x02"),
+                _json({"type": "audio_end"}),
+                {"type": "websocket.disconnect"},
+            ],
+        )
+
+        with patch(
+            "ws_handlers.streaming._process_interaction", new_callable=AsyncMock
+        ) as process_mock:
+            await ws_interact(ws)
+
+        process_mock.assert_awaited_once()
+        assert process_mock.call_args.kwargs["audio_data"] == b"\x00\x01\x02"
+
+    async def test_unknown_person_detections_reuse_cached_context(self):
+        """Dos person_detected desconocidos seguidos → una sola carga de contexto."""
+        detected = {
+            "type": "websocket.receive",
+            "text": json.dumps({"type": "person_detected", "known": False}),
+            "bytes": None,
+        }
+        ws = make_mock_ws(
+            receive_text_values=[
+                json.dumps(
+                    {"type": "auth", "api_key": "test-api-key-for-unit-tests-only"}
+                )
+            ],
+            receive_messages=[detected, detected, {"type": "websocket.disconnect"}],
+        )
+
+        with (
+            patch(
+                "ws_handlers.streaming.run_agent",
+                new_callable=AsyncMock,
+                return_value=make_mock_response(),
+            ) as agent_mock,
+            patch("ws_handlers.streaming._save_history_bg", new_callable=AsyncMock),
+            patch(
+                "ws_handlers.streaming._load_moji_context",
+                new_callable=AsyncMock,
+                return_value={"general": []},
+            ) as load_mock,
+            patch(
+                "ws_handlers.streaming.compact_memories_async", new_callable=AsyncMock
+            ),
+        ):
+            await ws_interact(ws)
+
+        assert agent_mock.await_count == 2
+        load_mock.assert_awaited_once_with(None)
+
+    async def test_oversized_text_frame_rejected(self):
+        """Frame de texto mayor que el límite → FRAME_TOO_LARGE sin parsear."""
+        ws = make_mock_ws(
+            receive_text_values=[
+                json.dumps(
+                    {"type": "auth", "api_key": "test-api-key-for-unit-tests-only"}
+                )
+            ],
+            receive_messages=[
+                {
+                    "type": "websocket.receive",
+                    "text": json.dumps({"type": "image", "data": "A" * 64}),
+                    "bytes": None,
+                },
+                {"type": "websocket.disconnect"},
+            ],
+        )
+
+        with (
+            patch("ws_handlers.streaming.settings") as settings_mock,
+            patch(
+                "ws_handlers.streaming._process_interaction", new_callable=AsyncMock
+            ) as process_mock,
+        ):
+            settings_mock.ws_max_message_size_bytes = 32
+            await ws_interact(ws)
+
+        process_mock.assert_not_awaited()
+        all_sent = [json.loads(c[0][0]) for c in ws.send_text.call_args_list]
+        codes = [m["error_code"] for m in all_sent if m["type"] == "error"]
+        assert codes == ["FRAME_TOO_LARGE"]
+
+    async def test_audio_over_limit_discarded_with_single_error(self):
+        """Audio acumulado por encima del límite → un error y audio_end no procesa."""
+        frame = {"type": "websocket.receive", "text": None, "bytes": b"x" * 40}
+        ws = make_mock_ws(
+            receive_text_values=[
+                json.dumps(
+                    {"type": "auth", "api_key": "test-api-key-for-unit-tests-only"}
+                )
+            ],
+            receive_messages=[
+                frame,
+                frame,
+                frame,
+                {
+                    "type": "websocket.receive",
+                    "text": json.dumps({"type": "audio_end", "request_id": "r1"}),
+                    "bytes": None,
+                },
+                frame,
+                {
+                    "type": "websocket.receive",
+                    "text": json.dumps({"type": "audio_end", "request_id": "r2"}),
+                    "bytes": None,
+                },
+                {"type": "websocket.disconnect"},
+            ],
+        )
+
+        with (
+            patch("ws_handlers.streaming.settings") as settings_mock,
+            patch(
+                "ws_handlers.streaming._process_interaction", new_callable=AsyncMock
+            ) as process_mock,
+        ):
+            settings_mock.ws_max_message_size_bytes = 64
+            await ws_interact(ws)
+
+        all_sent = [json.loads(c[0][0]) for c in ws.send_text.call_args_list]
+        codes = [m["error_code"] for m in all_sent if m["type"] == "error"]
+        assert codes == ["FRAME_TOO_LARGE"]
+        # Tras descartar, la siguiente interacción de audio funciona normalmente
+        process_mock.assert_awaited_once()
+        assert process_mock.call_args.kwargs["audio_data"] == b"x" * 40
+
     async def test_face_scan_mode_sends_face_scan_actions(self):
         """Mensaje face_scan_mode → se envía face_scan_actions."""
         ws = make_mock_ws(
@@ -19,10 +19,10 @@ Uso:
 """
 
 import asyncio
-import json
 import logging
 import secrets
 
+import orjson
 from fastapi import WebSocket
 from starlette.websockets import WebSocketState
 
@@ -70,8 +70,8 @@ async def authenticate_websocket(
 
     # Parsear JSON
     try:
-        data = json.loads(raw)
-    except (json.JSONDecodeError, ValueError):
+        data = orjson.loads(raw)
+    except orjson.JSONDecodeError:
         logger.warning("ws_auth: mensaje no es JSON válido")
         await _close_with_error(
             websocket,
@@ -80,10 +80,11 @@ async def authenticate_websocket(
         )
         return None
 
-    # Verificar tipo
-    if data.get("type") != "auth":
+    # Verificar tipo (JSON válido pero no objeto → tampoco es un mensaje auth)
+    msg_type = data.get("type") if isinstance(data, dict) else None
+    if msg_type != "auth":
         logger.warning(
-            "ws_auth: primer mensaje no es de tipo 'auth', es '%s'", data.get("type")
+            "ws_auth: primer mensaje no es de tipo 'auth', es '%s'", msg_type
         )
         await _close_with_error(
             websocket,
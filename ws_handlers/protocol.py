@@ -11,15 +11,18 @@ Uso:
     await websocket.send_text(make_auth_ok())
 """
 
-import json
 import uuid
 
+import orjson
+
 
 # ── Helpers internos ──────────────────────────────────────────────────────────
 
 
 def _to_json(data: dict) -> str:
-    return json.dumps(data, ensure_ascii=False)
+    # orjson serializa directamente a UTF-8 (equivalente a ensure_ascii=False);
+    # se decodifica a str porque el protocolo usa frames de texto.
+    return orjson.dumps(data).decode()
 
 
 def new_request_id() -> str:
@@ -7,7 +7,8 @@ Implementa el flujo completo:
   1. Acepta la conexión y autentica vía API Key.
   2. Bucle de mensajes: gestiona todos los tipos de mensaje del protocolo v2.0.
   3. Invoca el agente con structured output (MojiResponse).
-  4. Envía emotion + text_chunk + response_meta + stream_end.
+  4. Envía emotion + text_chunk + response_meta + stream_end a través de una
+     cola de salida por conexión (una sola tarea escritora hace los send_text).
   5. Background: historial + compactación de memorias + persistencia de persona/memoria.
 
 Uso (registrado en main.py):
@@ -20,13 +21,20 @@ Uso (registrado en main.py):
 
 import asyncio
 import base64
-import json
+import binascii
+import contextlib
+import hashlib
 import logging
 import time
+from collections.abc import Awaitable, Callable, Coroutine
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any
 
 import db as db_module
+import orjson
+from config import settings
 from fastapi import WebSocket
-from starlette.websockets import WebSocketState
 
 from repositories.memory import MemoryRepository
 from repositories.people import PeopleRepository
@@ -34,9 +42,8 @@ from services.agent import run_agent
 from services.expression import emotion_to_emojis, normalize_emotion_tag
 from services.memory_compaction import compact_memories_async
 from services.movement import (
-    action_steps_from_list,
-    build_response_actions,
     protocol_steps_from_steps,
+    response_actions_from_list,
 )
 from services.history import ConversationHistory
 from services.intent import classify_intent
@@ -61,6 +68,400 @@ _FACE_SCAN_SEQUENCE: list[dict] = [
     {"action": "turn_right_deg", "degrees": 45, "duration_ms": 500},
 ]
 
+# El mensaje face_scan_actions es constante salvo el request_id: se serializa
+# una vez al importar y en cada petición solo se inserta el id.
+_FACE_SCAN_RID_PLACEHOLDER = "__RID__"
+_FACE_SCAN_JSON_PREFIX, _FACE_SCAN_JSON_SUFFIX = make_face_scan_actions(
+    request_id=_FACE_SCAN_RID_PLACEHOLDER,
+    actions=protocol_steps_from_steps(_FACE_SCAN_SEQUENCE),
+).split(orjson.dumps(_FACE_SCAN_RID_PLACEHOLDER).decode())
+
+
+# ── Cola de salida por conexión ───────────────────────────────────────────────
+
+# Máximo de mensajes pendientes de envío por conexión. Una interacción produce
+# unos pocos mensajes; llegar a este límite indica un cliente que no lee.
+_OUTBOUND_MAX_PENDING = 256
+
+# Payloads base64 por encima de este tamaño se decodifican en un hilo para no
+# bloquear el event loop (vídeo/imagen de varios MB). El pool es propio y
+# pequeño: no compite con el executor por defecto que usa repositories/media.py.
+_B64_THREAD_THRESHOLD = 64 * 1024
+_B64_EXECUTOR = ThreadPoolExecutor(max_workers=4, thread_name_prefix="ws-b64")
+
+# Tareas de persistencia en background: se guarda referencia fuerte a cada una
+# (el event loop solo guarda referencias débiles) y se limita tanto el número
+# de tareas pendientes como las escrituras simultáneas a la BD.
+_BG_MAX_PENDING = 1024
+_BG_MAX_CONCURRENT = 8
+_bg_tasks: set[asyncio.Task] = set()
+_bg_slots = asyncio.Semaphore(_BG_MAX_CONCURRENT)
+# Tiempo máximo que el shutdown espera a las tareas pendientes antes de cancelarlas
+_BG_DRAIN_TIMEOUT_S = 10.0
+
+
+class _OutboundQueue:
+    """
+    Cola de mensajes salientes de una conexión con una única tarea escritora.
+
+    El handler encola con put() sin esperar al socket, de modo que un cliente
+    lento no frena el procesamiento. El orden y los límites son cosa de la
+    tarea escritora y de la cola, no del handler:
+
+    - La tarea escritora es la única que llama a send_text y envía en orden
+      de llegada.
+    - La cola admite como máximo _OUTBOUND_MAX_PENDING mensajes pendientes.
+      Si se llena (cliente que no drena, socket medio abierto), el mensaje se
+      descarta y la cola se marca cerrada.
+    - Tras el primer fallo de envío o desbordamiento, los mensajes siguientes
+      se descartan sin intentar enviarlos.
+    """
+
+    def __init__(
+        self, websocket: WebSocket, maxsize: int = _OUTBOUND_MAX_PENDING
+    ) -> None:
+        self._websocket = websocket
+        self._queue: asyncio.Queue[str | None] = asyncio.Queue(maxsize=maxsize)
+        self._task: asyncio.Task | None = None
+        self.closed = False
+
+    def start(self) -> None:
+        """Lanza la tarea escritora."""
+        self._task = asyncio.create_task(self._run(), name="ws-outbound")
+
+    def put(self, text: str) -> None:
+        """Encola un mensaje JSON para enviarlo; no bloquea."""
+        if self.closed:
+            return
+        try:
+            self._queue.put_nowait(text)
+        except asyncio.QueueFull:
+            logger.warning(
+                "ws: cola de salida llena (%d mensajes), se da la conexión por cerrada",
+                self._queue.maxsize,
+            )
+            self.closed = True
+
+    async def aclose(self) -> None:
+        """
+        Envía lo pendiente y detiene la tarea escritora.
+
+        Si la cola ya está cerrada (o llena) no se espera al socket: la tarea
+        se cancela y lo pendiente se descarta.
+        """
+        if self._task is None:
+            return
+        if self.closed:
+            self._task.cancel()
+        else:
+            try:
+                self._queue.put_nowait(None)
+            except asyncio.QueueFull:
+                self.closed = True
+                self._task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await self._task
+        self._task = None
+
+    async def _run(self) -> None:
+        # Un único try para toda la vida de la tarea: el envío en estado normal
+        # no comprueba client_state ni monta un manejador por mensaje. Si el
+        # cliente ya se fue, send_text lanza, la cola se cierra y lo pendiente
+        # se descarta (aclose cancela la tarea sin esperar).
+        get = self._queue.get
+        send_text = self._websocket.send_text
+        try:
+            while (text := await get()) is not None:
+                await send_text(text)
+        except Exception as exc:
+            logger.debug("ws: envío fallido, se cierra la cola de salida: %s", exc)
+            self.closed = True
+
+
+# ── Caché de contexto de memorias ────────────────────────────────────────────
+
+# Turnos consecutivos de la misma persona (en cualquier conexión) reutilizan el
+# contexto de memorias durante este tiempo en lugar de volver a consultar la BD.
+_CONTEXT_TTL_S = 30.0
+_CONTEXT_MAX_ENTRIES = 1024
+
+
+class _ContextCache:
+    """
+    Contexto de memorias (get_moji_context) por person_id, con TTL.
+
+    Compartido por todas las conexiones. Un lock por clave evita que varias
+    peticiones simultáneas de la misma persona lancen la misma consulta, y un
+    contador de generación impide guardar una carga que empezó antes de una
+    invalidación.
+    """
+
+    def __init__(
+        self, ttl: float = _CONTEXT_TTL_S, maxsize: int = _CONTEXT_MAX_ENTRIES
+    ) -> None:
+        self._ttl = ttl
+        self._maxsize = maxsize
+        self._entries: dict[str | None, tuple[float, dict]] = {}
+        # person_id → [lock, peticiones que lo usan]; la entrada se borra cuando
+        # nadie lo usa, así el dict no crece con cada person_id visto
+        self._locks: dict[str | None, list] = {}
+        self._generation = 0
+
+    def _fresh(self, person_id: str | None) -> dict | None:
+        entry = self._entries.get(person_id)
+        if entry is not None and time.monotonic() - entry[0] < self._ttl:
+            return entry[1]
+        return None
+
+    async def get(self, person_id: str | None) -> dict:
+        context = self._fresh(person_id)
+        if context is not None:
+            return context
+        slot = self._locks.get(person_id)
+        if slot is None:
+            slot = self._locks[person_id] = [asyncio.Lock(), 0]
+        slot[1] += 1
+        try:
+            async with slot[0]:
+                # Otra petición pudo cargarlo mientras se esperaba el lock
+                context = self._fresh(person_id)
+                if context is not None:
+                    return context
+                generation = self._generation
+                context = await _load_moji_context(person_id)
+                if generation == self._generation:
+                    if len(self._entries) >= self._maxsize:
+                        oldest = next(iter(self._entries))
+                        del self._entries[oldest]
+                    self._entries.pop(person_id, None)  # reinsertar al final
+                    self._entries[person_id] = (time.monotonic(), context)
+                return context
+        finally:
+            slot[1] -= 1
+            if slot[1] == 0 and self._locks.get(person_id) is slot:
+                del self._locks[person_id]
+
+    def invalidate(self, person_id: str | None) -> None:
+        """Descarta el contexto de `person_id`; None (memoria general) los descarta todos."""
+        self._generation += 1
+        if person_id is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(person_id, None)
+
+    def clear(self) -> None:
+        """Vacía la caché (p.ej. al cambiar de BD en los tests)."""
+        self.invalidate(None)
+        self._locks.clear()
+
+
+_context_cache = _ContextCache()
+
+
+# ── Estado de la conexión ─────────────────────────────────────────────────────
+
+
+@dataclass
+class _Connection:
+    """Estado mutable de una conexión /ws/interact compartido por los handlers."""
+
+    websocket: WebSocket
+    outbound: _OutboundQueue
+    history_service: ConversationHistory
+    person_id: str | None = None  # slug de la persona identificada
+    request_id: str = ""
+    # Frames de audio binarios; se unen una sola vez en audio_end. Se vacía con
+    # clear() (nunca se reasigna): el bucle de recepción guarda su .append.
+    audio_chunks: list[bytes] = field(default_factory=list)
+    # Bytes de audio recibidos en la interacción; sigue contando aunque se
+    # supere el límite para descartar el resto de frames hasta audio_end
+    audio_bytes: int = 0
+    pending_face_embedding: str | None = None  # base64 embedding pendiente de asociar
+
+    def resolve_request_id(self, msg: dict) -> str:
+        """request_id del mensaje, o el de la interacción en curso, o uno nuevo."""
+        self.request_id = msg.get("request_id") or self.request_id or new_request_id()
+        return self.request_id
+
+    def take_face_embedding(self, msg: dict) -> str | None:
+        """Embedding del mensaje o el pendiente de interaction_start (se consume)."""
+        face_emb = msg.get("face_embedding") or self.pending_face_embedding
+        self.pending_face_embedding = None
+        return face_emb
+
+    async def interact(self, **kwargs: Any) -> None:
+        """Lanza _process_interaction sobre esta conexión."""
+        await _process_interaction(
+            websocket=self.websocket,
+            outbound=self.outbound,
+            history_service=self.history_service,
+            context_cache=_context_cache,
+            **kwargs,
+        )
+
+
+# ── Handlers por tipo de mensaje ──────────────────────────────────────────────
+
+
+async def _on_interaction_start(conn: _Connection, msg: dict) -> None:
+    conn.person_id = msg.get("person_id") or None
+    conn.request_id = msg.get("request_id") or new_request_id()
+    conn.audio_chunks.clear()  # limpiar audio de la interacción anterior
+    conn.audio_bytes = 0
+    conn.pending_face_embedding = msg.get("face_embedding") or None
+    logger.debug(
+        "ws: interaction_start person_id=%s request_id=%s has_embedding=%s",
+        conn.person_id,
+        conn.request_id,
+        conn.pending_face_embedding is not None,
+    )
+
+
+async def _on_text(conn: _Connection, msg: dict) -> None:
+    user_input = msg.get("content", "")
+    request_id = conn.resolve_request_id(msg)
+    face_emb = conn.take_face_embedding(msg)
+    if user_input:
+        await conn.interact(
+            person_id=conn.person_id,
+            request_id=request_id,
+            user_input=user_input,
+            input_type="text",
+            face_embedding_b64=face_emb,
+        )
+
+
+async def _on_audio_end(conn: _Connection, msg: dict) -> None:
+    request_id = conn.resolve_request_id(msg)
+    face_emb = conn.take_face_embedding(msg)
+    if conn.audio_bytes > settings.ws_max_message_size_bytes:
+        # Audio descartado por tamaño (el error ya se envió al superar el límite)
+        conn.audio_chunks.clear()
+        conn.audio_bytes = 0
+        return
+    if not conn.audio_chunks:
+        conn.outbound.put(
+            make_error(
+                "EMPTY_AUDIO",
+                "No se recibieron datos de audio",
+                request_id=request_id,
+                recoverable=True,
+            )
+        )
+        return
+    audio_data = b"".join(conn.audio_chunks)
+    conn.audio_chunks.clear()
+    conn.audio_bytes = 0
+    await conn.interact(
+        person_id=conn.person_id,
+        request_id=request_id,
+        user_input=None,
+        input_type="audio",
+        audio_data=audio_data,
+        face_embedding_b64=face_emb,
+    )
+
+
+async def _on_image(conn: _Connection, msg: dict) -> None:
+    request_id = conn.resolve_request_id(msg)
+    image_bytes = await _b64_field(msg, "data")
+    face_emb = conn.take_face_embedding(msg)
+    await conn.interact(
+        person_id=conn.person_id,
+        request_id=request_id,
+        user_input=msg.get("text") or None,
+        input_type="vision",
+        image_data=image_bytes,
+        face_embedding_b64=face_emb,
+    )
+
+
+async def _on_video(conn: _Connection, msg: dict) -> None:
+    request_id = conn.resolve_request_id(msg)
+    video_bytes = await _b64_field(msg, "data")
+    await conn.interact(
+        person_id=conn.person_id,
+        request_id=request_id,
+        user_input=msg.get("text") or None,
+        input_type="vision",
+        video_data=video_bytes,
+    )
+
+
+async def _on_multimodal(conn: _Connection, msg: dict) -> None:
+    request_id = conn.resolve_request_id(msg)
+    mm_audio = await _b64_field(msg, "audio")
+    mm_image = await _b64_field(msg, "image")
+    mm_video = await _b64_field(msg, "video")
+    face_emb = conn.take_face_embedding(msg)
+
+    input_type = (
+        "vision" if (mm_image or mm_video) else ("audio" if mm_audio else "text")
+    )
+    await conn.interact(
+        person_id=conn.person_id,
+        request_id=request_id,
+        user_input=msg.get("text") or None,
+        input_type=input_type,
+        audio_data=mm_audio,
+        image_data=mm_image,
+        video_data=mm_video,
+        audio_mime_type=msg.get("audio_mime", "audio/webm"),
+        image_mime_type=msg.get("image_mime", "image/jpeg"),
+        video_mime_type=msg.get("video_mime", "video/mp4"),
+        face_embedding_b64=face_emb,
+    )
+
+
+# ── Mensajes nuevos v2.0 ──────────────────────────────────────────────────────
+
+
+async def _on_face_scan_mode(conn: _Connection, msg: dict) -> None:
+    # Android inicia escaneo facial activo — Moji gira con secuencia predefinida.
+    req_id = msg.get("request_id") or new_request_id()
+    conn.outbound.put(_face_scan_message(req_id))
+
+
+async def _on_person_detected(conn: _Connection, msg: dict) -> None:
+    # Android informa de una persona detectada.
+    req_id = msg.get("request_id") or new_request_id()
+    detected_pid = msg.get("person_id") or None
+    if msg.get("known", False) and detected_pid:
+        conn.person_id = detected_pid
+        logger.info(
+            "ws: persona conocida detectada person_id=%s conf=%.2f",
+            conn.person_id,
+            msg.get("confidence", 0.0),
+        )
+        return
+
+    # Cara desconocida: Moji debe preguntar el nombre. El contexto (solo
+    # memorias generales) sale de la caché de la conexión: las detecciones
+    # seguidas durante face_scan_mode no vuelven a consultar la BD.
+    await conn.interact(
+        person_id=None,
+        request_id=req_id,
+        user_input=(
+            "Acabo de detectar a una persona que no conozco. "
+            "Salúdala con curiosidad y pregúntale su nombre de forma amigable."
+        ),
+        input_type="text",
+    )
+
+
+# Tabla de despacho: tipo de mensaje del cliente → handler.
+# Los tipos desconocidos se ignoran.
+_HANDLERS: dict[str, Callable[[_Connection, dict], Awaitable[None]]] = {
+    "interaction_start": _on_interaction_start,
+    "text": _on_text,
+    "audio_end": _on_audio_end,
+    "image": _on_image,
+    "video": _on_video,
+    "multimodal": _on_multimodal,
+    "face_scan_mode": _on_face_scan_mode,
+    "person_detected": _on_person_detected,
+}
+
 
 # ── Entry point ───────────────────────────────────────────────────────────────
 
@@ -82,23 +483,35 @@ async def ws_interact(websocket: WebSocket) -> None:
     history_service = ConversationHistory()
     await history_service.load_from_db()
 
-    # Estado de la interacción actual
-    person_id: str | None = None  # slug de la persona identificada
-    request_id: str = ""
-    audio_buffer: bytes = b""
-    pending_face_embedding: str | None = None  # base64 embedding pendiente de asociar
+    # Cola de salida: el handler encola sin esperar al socket
+    outbound = _OutboundQueue(websocket)
+    outbound.start()
+
+    conn = _Connection(
+        websocket=websocket, outbound=outbound, history_service=history_service
+    )
 
     logger.info(
         "ws: conexión autenticada, historial con %d mensajes",
         len(history_service._cache),
     )
 
+    # Referencias locales para el bucle de recepción (evita buscar en el
+    # módulo / en el objeto en cada mensaje)
+    receive = websocket.receive
+    loads = orjson.loads
+    send = outbound.put
+    handlers = _HANDLERS
+    audio_append = conn.audio_chunks.append
+    max_size = settings.ws_max_message_size_bytes
+
     try:
         while True:
             # Recibir siguiente mensaje (texto JSON o binario)
-            data = await websocket.receive()
+            data = await receive()
 
-            msg_type = data.get("type", "")
+            # "type" siempre viene en los mensajes ASGI; "bytes"/"text" son opcionales
+            msg_type = data["type"]
 
             # Desconexión limpia del cliente
             if msg_type == "websocket.disconnect":
@@ -108,7 +521,22 @@ async def ws_interact(websocket: WebSocket) -> None:
             # ── Mensajes binarios (audio frames) ─────────────────────────────
             raw_bytes = data.get("bytes")
             if raw_bytes:
-                audio_buffer += raw_bytes
+                prev_bytes = conn.audio_bytes
+                conn.audio_bytes = prev_bytes + len(raw_bytes)
+                if conn.audio_bytes <= max_size:
+                    audio_append(raw_bytes)
+                elif prev_bytes <= max_size:
+                    # Primer frame que supera el límite: se libera lo acumulado
+                    # y se avisa una sola vez
+                    conn.audio_chunks.clear()
+                    send(
+                        make_error(
+                            "FRAME_TOO_LARGE",
+                            "El audio supera el tamaño máximo permitido",
+                            request_id=conn.request_id or None,
+                            recoverable=True,
+                        )
+                    )
                 continue
 
             # ── Mensajes de texto (JSON) ──────────────────────────────────────
@@ -116,229 +544,44 @@ async def ws_interact(websocket: WebSocket) -> None:
             if not raw_text:
                 continue
 
-            try:
-                msg = json.loads(raw_text)
-            except (json.JSONDecodeError, ValueError):
-                await _send_safe(
-                    websocket,
-                    make_error("INVALID_MESSAGE", "Mensaje no es JSON válido"),
-                )
-                continue
-
-            client_type = msg.get("type", "")
-
-            if client_type == "interaction_start":
-                person_id = msg.get("person_id") or None
-                request_id = msg.get("request_id") or new_request_id()
-                audio_buffer = b""  # limpiar buffer de interacción anterior
-                pending_face_embedding = msg.get("face_embedding") or None
-                logger.debug(
-                    "ws: interaction_start person_id=%s request_id=%s has_embedding=%s",
-                    person_id,
-                    request_id,
-                    pending_face_embedding is not None,
-                )
-
-            elif client_type == "text":
-                user_input = msg.get("content", "")
-                if not request_id:
-                    request_id = msg.get("request_id") or new_request_id()
-                else:
-                    request_id = msg.get("request_id") or request_id
-                face_emb = msg.get("face_embedding") or pending_face_embedding
-                pending_face_embedding = None
-
-                if user_input:
-                    await _process_interaction(
-                        websocket=websocket,
-                        person_id=person_id,
-                        request_id=request_id,
-                        user_input=user_input,
-                        input_type="text",
-                        history_service=history_service,
-                        face_embedding_b64=face_emb,
-                    )
-
-            elif client_type == "audio_end":
-                if not request_id:
-                    request_id = msg.get("request_id") or new_request_id()
-                else:
-                    request_id = msg.get("request_id") or request_id
-                face_emb = msg.get("face_embedding") or pending_face_embedding
-                pending_face_embedding = None
-
-                if audio_buffer:
-                    audio_data = audio_buffer
-                    audio_buffer = b""
-                    await _process_interaction(
-                        websocket=websocket,
-                        person_id=person_id,
-                        request_id=request_id,
-                        user_input=None,
-                        input_type="audio",
-                        audio_data=audio_data,
-                        history_service=history_service,
-                        face_embedding_b64=face_emb,
+            # Rechazar antes de parsear: un campo base64 enorme reservaría
+            # cientos de MB al decodificarlo
+            if len(raw_text) > max_size:
+                send(
+                    make_error(
+                        "FRAME_TOO_LARGE",
+                        "Mensaje supera el tamaño máximo permitido",
+                        recoverable=True,
                     )
-                else:
-                    await _send_safe(
-                        websocket,
-                        make_error(
-                            "EMPTY_AUDIO",
-                            "No se recibieron datos de audio",
-                            request_id=request_id,
-                            recoverable=True,
-                        ),
-                    )
-
-            elif client_type == "image":
-                if not request_id:
-                    request_id = msg.get("request_id") or new_request_id()
-                else:
-                    request_id = msg.get("request_id") or request_id
-                raw_b64 = msg.get("data", "")
-                image_bytes: bytes | None = None
-                if raw_b64:
-                    try:
-                        image_bytes = base64.b64decode(raw_b64)
-                    except Exception:
-                        image_bytes = None
-                inline_text: str | None = msg.get("text") or None
-                face_emb = msg.get("face_embedding") or pending_face_embedding
-                pending_face_embedding = None
-                await _process_interaction(
-                    websocket=websocket,
-                    person_id=person_id,
-                    request_id=request_id,
-                    user_input=inline_text,
-                    input_type="vision",
-                    image_data=image_bytes,
-                    history_service=history_service,
-                    face_embedding_b64=face_emb,
-                )
-
-            elif client_type == "video":
-                if not request_id:
-                    request_id = msg.get("request_id") or new_request_id()
-                else:
-                    request_id = msg.get("request_id") or request_id
-                raw_b64 = msg.get("data", "")
-                video_bytes: bytes | None = None
-                if raw_b64:
-                    try:
-                        video_bytes = base64.b64decode(raw_b64)
-                    except Exception:
-                        video_bytes = None
-                inline_text_v: str | None = msg.get("text") or None
-                await _process_interaction(
-                    websocket=websocket,
-                    person_id=person_id,
-                    request_id=request_id,
-                    user_input=inline_text_v,
-                    input_type="vision",
-                    video_data=video_bytes,
-                    history_service=history_service,
                 )
+                continue
 
-            elif client_type == "multimodal":
-                if not request_id:
-                    request_id = msg.get("request_id") or new_request_id()
-                else:
-                    request_id = msg.get("request_id") or request_id
-
-                def _b64_decode(field: str) -> bytes | None:
-                    raw = msg.get(field)
-                    if not raw:
-                        return None
-                    try:
-                        return base64.b64decode(raw)
-                    except Exception:
-                        return None
-
-                mm_text: str | None = msg.get("text") or None
-                mm_audio = _b64_decode("audio")
-                mm_image = _b64_decode("image")
-                mm_video = _b64_decode("video")
-                mm_audio_mime: str = msg.get("audio_mime", "audio/webm")
-                mm_image_mime: str = msg.get("image_mime", "image/jpeg")
-                mm_video_mime: str = msg.get("video_mime", "video/mp4")
-                face_emb_mm = msg.get("face_embedding") or pending_face_embedding
-                pending_face_embedding = None
-
-                input_type_mm = (
-                    "vision"
-                    if (mm_image or mm_video)
-                    else ("audio" if mm_audio else "text")
-                )
-                await _process_interaction(
-                    websocket=websocket,
-                    person_id=person_id,
-                    request_id=request_id,
-                    user_input=mm_text,
-                    input_type=input_type_mm,
-                    audio_data=mm_audio,
-                    image_data=mm_image,
-                    video_data=mm_video,
-                    audio_mime_type=mm_audio_mime,
-                    image_mime_type=mm_image_mime,
-                    video_mime_type=mm_video_mime,
-                    history_service=history_service,
-                    face_embedding_b64=face_emb_mm,
-                )
+            try:
+                msg = loads(raw_text)
+            except orjson.JSONDecodeError:
+                send(make_error("INVALID_MESSAGE", "Mensaje no es JSON válido"))
+                continue
 
-            # ── Mensajes nuevos v2.0 ───────────────────────────────────────────
+            # JSON válido pero no es un objeto (lista, número…) → no es un mensaje
+            if not isinstance(msg, dict):
+                send(make_error("INVALID_MESSAGE", "Mensaje no es un objeto JSON"))
+                continue
 
-            elif client_type == "face_scan_mode":
-                # Android inicia escaneo facial activo — Moji gira con secuencia predefinida.
-                req_id = msg.get("request_id") or new_request_id()
-                scan_seq = protocol_steps_from_steps(_FACE_SCAN_SEQUENCE)
-                await _send_safe(
-                    websocket,
-                    make_face_scan_actions(request_id=req_id, actions=scan_seq),
-                )
-
-            elif client_type == "person_detected":
-                # Android informa de una persona detectada.
-                req_id = msg.get("request_id") or new_request_id()
-                known = msg.get("known", False)
-                detected_pid = msg.get("person_id") or None
-                confidence = msg.get("confidence", 0.0)
-                if known and detected_pid:
-                    person_id = detected_pid
-                    logger.info(
-                        "ws: persona conocida detectada person_id=%s conf=%.2f",
-                        person_id,
-                        confidence,
-                    )
-                else:
-                    # Cara desconocida: Moji debe preguntar el nombre
-                    context = await _load_moji_context(None)
-                    ask_input = (
-                        "Acabo de detectar a una persona que no conozco. "
-                        "Salúdala con curiosidad y pregúntale su nombre de forma amigable."
-                    )
-                    await _process_interaction(
-                        websocket=websocket,
-                        person_id=None,
-                        request_id=req_id,
-                        user_input=ask_input,
-                        input_type="text",
-                        history_service=history_service,
-                        memory_context=context,
-                    )
+            handler = handlers.get(msg.get("type", ""))
+            if handler is not None:
+                await handler(conn, msg)
 
     except Exception as exc:
         logger.error("ws: error inesperado: %s", exc, exc_info=True)
-        if websocket.client_state == WebSocketState.CONNECTED:
-            await _send_safe(
-                websocket,
-                make_error(
-                    "INTERNAL_ERROR",
-                    "Error interno del servidor",
-                    recoverable=False,
-                ),
+        outbound.put(
+            make_error(
+                "INTERNAL_ERROR",
+                "Error interno del servidor",
+                recoverable=False,
             )
+        )
     finally:
+        await outbound.aclose()
         logger.info("ws: conexión cerrada")
 
 
@@ -361,168 +604,240 @@ async def _process_interaction(
     video_mime_type: str = "video/mp4",
     face_embedding_b64: str | None = None,
     memory_context: dict | None = None,
+    outbound: _OutboundQueue | None = None,
+    context_cache: _ContextCache | None = None,
 ) -> None:
     """
     Procesa una interacción completa:
       load context → run_agent (structured output) → emit emotion + text_chunk
       → persist memories/person → emit meta + stream_end → background tasks
     """
-    start_time = time.monotonic()
+    # Sin cola de la conexión (p.ej. llamada aislada) → cola propia que se
+    # vacía al terminar la interacción
+    owns_outbound = outbound is None
+    if outbound is None:
+        outbound = _OutboundQueue(websocket)
+        outbound.start()
 
-    # 1. Cargar contexto de memorias (si no se pasó ya)
-    if memory_context is None:
-        memory_context = await _load_moji_context(person_id)
+    try:
+        start_ns = time.perf_counter_ns()
 
-    # 2. Obtener historial global
-    history = history_service.get_history()
+        # 1. Cargar contexto de memorias (si no se pasó ya)
+        if memory_context is None:
+            if context_cache is not None:
+                memory_context = await context_cache.get(person_id)
+            else:
+                memory_context = await _load_moji_context(person_id)
 
-    logger.info("History (%d mensajes): %s", len(history), history)
+        # 2. Obtener historial global
+        history = history_service.get_history()
 
-    has_media = (
-        audio_data is not None or image_data is not None or video_data is not None
-    )
-    has_face_embedding = face_embedding_b64 is not None
+        logger.info("History (%d mensajes): %s", len(history), history)
 
-    # 3. Invocar el agente con structured output
-    try:
-        response = await run_agent(
-            user_input=user_input,
-            history=history,
-            person_id=person_id,
-            audio_data=audio_data,
-            audio_mime_type=audio_mime_type,
-            image_data=image_data,
-            image_mime_type=image_mime_type,
-            video_data=video_data,
-            video_mime_type=video_mime_type,
-            memory_context=memory_context,
-            has_face_embedding=has_face_embedding,
+        has_media = (
+            audio_data is not None or image_data is not None or video_data is not None
         )
-    except Exception as exc:
-        logger.error(
-            "ws: error en agente request_id=%s: %s",
-            request_id,
-            exc,
-            exc_info=True,
-        )
-        await _send_safe(
-            websocket,
-            make_error(
-                "AGENT_ERROR",
-                "Error procesando la solicitud",
+        has_face_embedding = face_embedding_b64 is not None
+
+        # 3. Invocar el agente con structured output
+        try:
+            response = await run_agent(
+                user_input=user_input,
+                history=history,
+                person_id=person_id,
+                audio_data=audio_data,
+                audio_mime_type=audio_mime_type,
+                image_data=image_data,
+                image_mime_type=image_mime_type,
+                video_data=video_data,
+                video_mime_type=video_mime_type,
+                memory_context=memory_context,
+                has_face_embedding=has_face_embedding,
+            )
+        except Exception as exc:
+            logger.error(
+                "ws: error en agente request_id=%s: %s",
+                request_id,
+                exc,
+                exc_info=True,
+            )
+            outbound.put(
+                make_error(
+                    "AGENT_ERROR",
+                    "Error procesando la solicitud",
+                    request_id=request_id,
+                    recoverable=True,
+                )
+            )
+            return
+
+        # 4. Enviar emoción
+        normalized_emotion = normalize_emotion_tag(response.emotion)
+
+        outbound.put(
+            make_emotion(
                 request_id=request_id,
-                recoverable=True,
-            ),
+                emotion=normalized_emotion,
+                person_identified=person_id,
+            )
         )
-        return
 
-    # 4. Enviar emoción
-    normalized_emotion = normalize_emotion_tag(response.emotion)
+        # 5. Enviar el texto de respuesta como un único chunk
+        if response.response_text:
+            outbound.put(make_text_chunk(request_id, response.response_text))
+
+        # 6. Persistir memories y person_name (solo si hay face embedding) en
+        #    background: una única tarea y una única transacción por respuesta
+        memories = [(mem.memory_type, mem.content) for mem in response.memories]
+        new_person_name = response.person_name if face_embedding_b64 else None
+        if memories or new_person_name:
+            _spawn_bg(
+                _save_turn_bg(
+                    memories,
+                    person_id=person_id,
+                    person_name=new_person_name,
+                    face_embedding_b64=face_embedding_b64,
+                ),
+                name=f"turn-{request_id}",
+            )
 
-    await _send_safe(
-        websocket,
-        make_emotion(
-            request_id=request_id,
-            emotion=normalized_emotion,
-            person_identified=person_id,
-        ),
-    )
+        # 7. Detectar intent de captura
+        intent = classify_intent(response.response_text)
+        if intent == "photo_request":
+            outbound.put(make_capture_request(request_id, "photo"))
+        elif intent == "video_request":
+            outbound.put(make_capture_request(request_id, "video"))
+
+        # 8. Construir y enviar response_meta
+        # Emojis: primero los contextuales del LLM, luego respaldo de emoción
+        emotion_emojis = emotion_to_emojis(normalized_emotion)
+        emojis = (
+            (response.emojis + emotion_emojis[:2])
+            if response.emojis
+            else emotion_emojis
+        )
+        # Acciones: convertir lista de strings a secuencia ESP32 (cacheado)
+        actions = response_actions_from_list(response.actions)
 
-    # 5. Enviar el texto de respuesta como un único chunk
-    if response.response_text:
-        await _send_safe(websocket, make_text_chunk(request_id, response.response_text))
+        processing_ms = (time.perf_counter_ns() - start_ns) // 1_000_000
 
-    # 6. Persistir memories en background
-    for mem in response.memories:
-        asyncio.create_task(
-            _save_memory_bg(
-                memory_type=mem.memory_type,
-                content=mem.content,
-                person_id=person_id,
-            ),
-            name=f"memory-{request_id}",
+        outbound.put(
+            make_response_meta(
+                request_id=request_id,
+                response_text=response.response_text,
+                emojis=emojis,
+                actions=actions,
+                person_name=response.person_name,
+            )
         )
 
-    # 7. Persistir person_name en background (solo si hay face embedding)
-    if has_face_embedding and face_embedding_b64 and response.person_name:
-        asyncio.create_task(
-            _save_person_name_bg(
-                name=response.person_name,
-                person_id=person_id,
-                face_embedding_b64=face_embedding_b64,
-            ),
-            name=f"person-{request_id}",
+        # 9. Enviar stream_end
+        outbound.put(
+            make_stream_end(request_id=request_id, processing_time_ms=processing_ms)
         )
 
-    # 8. Detectar intent de captura
-    intent = classify_intent(response.response_text)
-    if intent == "photo_request":
-        await _send_safe(websocket, make_capture_request(request_id, "photo"))
-    elif intent == "video_request":
-        await _send_safe(websocket, make_capture_request(request_id, "video"))
-
-    # 9. Construir y enviar response_meta
-    # Emojis: primero los contextuales del LLM, luego respaldo de emoción
-    emotion_emojis = emotion_to_emojis(normalized_emotion)
-    emojis = (
-        (response.emojis + emotion_emojis[:2]) if response.emojis else emotion_emojis
-    )
-    # Acciones: convertir lista de strings a secuencia ESP32
-    actions: list[dict] = []
-    if response.actions:
-        steps = action_steps_from_list(response.actions)
-        if steps:
-            actions = build_response_actions(steps)
-
-    processing_ms = int((time.monotonic() - start_time) * 1000)
-
-    await _send_safe(
-        websocket,
-        make_response_meta(
-            request_id=request_id,
-            response_text=response.response_text,
-            emojis=emojis,
-            actions=actions,
-            person_name=response.person_name,
-        ),
-    )
+        # 10. Background: guardar historial
+        if not has_media:
+            history_user_msg = user_input or ""
+        elif response.media_summary:
+            history_user_msg = response.media_summary
+        else:
+            logger.warning(
+                "ws: LLM no rellenó media_summary para interacción media "
+                "request_id=%s — usando placeholder",
+                request_id,
+            )
+            history_user_msg = "[audio]" if audio_data is not None else "[imagen/video]"
+
+        # 11. Background: historial + compactación de memorias en una sola tarea.
+        # Si no hay nada que guardar (respuesta y entrada vacías) no se lanza nada.
+        if response.response_text.strip() or history_user_msg.strip():
+            _spawn_bg(
+                _post_response_bg(
+                    history_service=history_service,
+                    user_message=history_user_msg,
+                    assistant_message=response.response_text,
+                    person_id=person_id,
+                ),
+                name=f"post-{request_id}",
+            )
+
+    finally:
+        if owns_outbound:
+            await outbound.aclose()
 
-    # 10. Enviar stream_end
-    await _send_safe(
-        websocket,
-        make_stream_end(request_id=request_id, processing_time_ms=processing_ms),
-    )
 
-    # 11. Background: guardar historial
-    if not has_media:
-        history_user_msg = user_input or ""
-    elif response.media_summary:
-        history_user_msg = response.media_summary
-    else:
+# ── Background tasks ──────────────────────────────────────────────────────────
+
+
+def _spawn_bg(coro: Coroutine[Any, Any, None], *, name: str) -> asyncio.Task | None:
+    """
+    Lanza `coro` como tarea de background acotada.
+
+    Si ya hay _BG_MAX_PENDING tareas vivas, el trabajo se descarta con un
+    warning en lugar de acumularse sin límite.
+    """
+    if len(_bg_tasks) >= _BG_MAX_PENDING:
+        coro.close()
+        logger.warning("ws: cola de background llena, descartando tarea %s", name)
+        return None
+    task = asyncio.create_task(_run_bg(coro), name=name)
+    _bg_tasks.add(task)
+    task.add_done_callback(_bg_tasks.discard)
+    return task
+
+
+async def _run_bg(coro: Coroutine[Any, Any, None]) -> None:
+    async with _bg_slots:
+        try:
+            await coro
+        except Exception:
+            # Sin esto el error solo aparecería como "Task exception was never
+            # retrieved" cuando el GC recoja la tarea
+            logger.exception("ws: error no controlado en tarea de background")
+
+
+async def drain_background_tasks(timeout: float = _BG_DRAIN_TIMEOUT_S) -> None:
+    """
+    Espera (hasta `timeout` segundos) a que terminen las tareas de background.
+
+    Las tareas no dependen de la conexión (una desconexión no las cancela),
+    pero al parar el servidor se perderían las escrituras aún en vuelo. Llamar
+    desde el shutdown del lifespan antes de cerrar el engine; lo que no termine
+    a tiempo se cancela.
+    """
+    if not _bg_tasks:
+        return
+    _, pending = await asyncio.wait(set(_bg_tasks), timeout=timeout)
+    if pending:
         logger.warning(
-            "ws: LLM no rellenó media_summary para interacción media "
-            "request_id=%s — usando placeholder",
-            request_id,
+            "ws: cancelando %d tareas de background sin terminar", len(pending)
         )
-        history_user_msg = "[audio]" if audio_data is not None else "[imagen/video]"
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
 
-    asyncio.create_task(
-        _save_history_bg(
-            history_service=history_service,
-            user_message=history_user_msg,
-            assistant_message=response.response_text,
-            person_id=person_id,
-        )
-    )
 
-    # 12. Background: compactación de memorias
-    asyncio.create_task(
-        compact_memories_async(person_id=person_id),
-        name=f"compact-memories-{request_id}",
+async def _post_response_bg(
+    history_service: ConversationHistory,
+    user_message: str,
+    assistant_message: str,
+    person_id: str | None = None,
+) -> None:
+    """Trabajo de fin de respuesta: guarda el historial y luego compacta memorias."""
+    await _save_history_bg(
+        history_service=history_service,
+        user_message=user_message,
+        assistant_message=assistant_message,
+        person_id=person_id,
     )
-
-
-# ── Background tasks ──────────────────────────────────────────────────────────
+    try:
+        if await compact_memories_async(person_id=person_id):
+            _context_cache.invalidate(person_id)
+    except Exception as exc:
+        logger.warning(
+            "ws: error compactando memorias person_id=%s: %s", person_id, exc
+        )
 
 
 async def _save_history_bg(
@@ -533,61 +848,75 @@ async def _save_history_bg(
 ) -> None:
     """Guarda los mensajes de la interacción en el historial y compacta si es necesario."""
     try:
-        await history_service.add_message("user", user_message, person_id=person_id)
-        await history_service.add_message("assistant", assistant_message)
+        await history_service.add_messages(
+            [("user", user_message), ("assistant", assistant_message)],
+            person_id=person_id,
+        )
         await history_service.compact_if_needed()
     except Exception as exc:
         logger.warning("ws: error guardando historial: %s", exc)
 
 
-async def _save_memory_bg(
-    memory_type: str,
-    content: str,
+async def _save_turn_bg(
+    memories: list[tuple[str, str]],
     person_id: str | None = None,
+    person_name: str | None = None,
+    face_embedding_b64: str | None = None,
 ) -> None:
-    """Persiste una memoria extraída del tag [memory:TIPO:contenido] en background."""
+    """
+    Persiste en background las escrituras de una respuesta en una sola
+    transacción: las memorias `(tipo, contenido)` y, si el LLM dio nombre a una
+    cara (`person_name` + `face_embedding_b64`), la persona con su embedding.
+    Tras el commit invalida el contexto cacheado si se guardaron memorias.
+    """
     if db_module.AsyncSessionLocal is None:
         return
-    try:
-        async with db_module.AsyncSessionLocal() as session:
-            repo = MemoryRepository(session)
-            await repo.save(
-                memory_type=memory_type,
-                content=content,
-                person_id=person_id,
-            )
-            await session.commit()
-    except Exception as exc:
-        logger.warning("ws: error guardando memoria type=%s: %s", memory_type, exc)
 
+    person: tuple[str, str, bytes] | None = None
+    if person_name and face_embedding_b64:
+        try:
+            embedding = binascii.a2b_base64(face_embedding_b64)
+        except (ValueError, TypeError) as exc:  # binascii.Error es ValueError
+            # Un embedding corrupto no debe tumbar el guardado de memorias
+            logger.warning("ws: embedding inválido para name=%s: %s", person_name, exc)
+        else:
+            # Sufijo derivado del nombre: el mismo nombre produce siempre el
+            # mismo slug (id() cambiaba en cada ejecución y duplicaba personas).
+            suffix = hashlib.blake2b(person_name.encode(), digest_size=2).hexdigest()
+            slug = (
+                person_id
+                or f"persona_{person_name.lower().replace(' ', '_')[:20]}_{suffix}"
+            )
+            person = (slug, person_name, embedding)
 
-async def _save_person_name_bg(
-    name: str,
-    person_id: str | None,
-    face_embedding_b64: str,
-) -> None:
-    """
-    Registra (o actualiza) la persona en la BD y guarda su embedding facial.
-    Llamado cuando el LLM emite [person_name:NOMBRE] junto a un face_embedding.
-    """
-    if db_module.AsyncSessionLocal is None:
+    if not memories and person is None:
         return
+
     try:
-        slug = (
-            person_id
-            or f"persona_{name.lower().replace(' ', '_')[:20]}_{id(name) % 10000:04d}"
-        )
-        embedding_bytes = base64.b64decode(face_embedding_b64)
-        async with db_module.AsyncSessionLocal() as session:
-            people_repo = PeopleRepository(session)
-            person, created = await people_repo.get_or_create(slug, name)
-            if not created and person.name != name:
-                await people_repo.update_name(slug, name)
-            await people_repo.add_embedding(slug, embedding_bytes)
-            await session.commit()
-        logger.info("ws: persona registrada person_id=%s name=%s", slug, name)
+        async with db_module.AsyncSessionLocal() as session, session.begin():
+            if memories:
+                await MemoryRepository(session).save_many(memories, person_id=person_id)
+            if person is not None:
+                slug, name, embedding = person
+                people_repo = PeopleRepository(session)
+                existing, created = await people_repo.get_or_create(slug, name)
+                if not created and existing.name != name:
+                    await people_repo.update_name(slug, name)
+                await people_repo.add_embedding(slug, embedding)
     except Exception as exc:
-        logger.warning("ws: error registrando persona name=%s: %s", name, exc)
+        logger.warning(
+            "ws: error guardando respuesta (%d memorias, persona=%s) person_id=%s: %s",
+            len(memories),
+            person_name,
+            person_id,
+            exc,
+        )
+        return
+
+    if person is not None:
+        logger.info("ws: persona registrada person_id=%s name=%s", person[0], person[1])
+    if memories:
+        _context_cache.invalidate(person_id)
 
 
 # ── Helpers ───────────────────────────────────────────────────────────────────
@@ -606,10 +935,24 @@ async def _load_moji_context(person_id: str | None) -> dict:
         return {}
 
 
-async def _send_safe(websocket: WebSocket, text: str) -> None:
-    """Envía un mensaje de texto ignorando errores si la conexión está cerrada."""
+async def _b64_field(msg: dict, field: str) -> bytes | None:
+    """Decodifica el campo base64 `field` del mensaje; None si falta o es inválido."""
+    raw = msg.get(field)
+    if not raw:
+        return None
     try:
-        if websocket.client_state == WebSocketState.CONNECTED:
-            await websocket.send_text(text)
-    except Exception as exc:
-        logger.debug("ws: _send_safe ignorando error: %s", exc)
+        if len(raw) > _B64_THREAD_THRESHOLD:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(_B64_EXECUTOR, base64.b64decode, raw)
+        return base64.b64decode(raw)
+    except Exception:
+        return None
+
+
+def _face_scan_message(request_id: str) -> str:
+    """Mensaje face_scan_actions precalculado con el request_id dado."""
+    return (
+        _FACE_SCAN_JSON_PREFIX
+        + orjson.dumps(request_id).decode()
+        + _FACE_SCAN_JSON_SUFFIX
+    )